@@ -0,0 +1,184 @@
+"""Benchmarks of GameField hot paths across board sizes and color counts.
+
+Usage:
+    python benchmark.py --output bench.json
+    python benchmark.py --compare bench.json --threshold 0.25
+"""
+import argparse
+import json
+import platform
+import sys
+from datetime import datetime
+from statistics import median
+from time import perf_counter
+
+import numpy as np
+from PyQt5.QtCore import QCoreApplication
+
+from benchtools import check_baseline, parse_size
+from enums import GameDifficulty
+from game_logic import GameField
+from tableContainer import BACKENDS
+
+SIZES = [d.value for d in GameDifficulty] + [(50, 50), (100, 100), (500, 500)]
+COLORS = [3, 5, 8]
+OPERATIONS = ["find_same_items", "cell_clicked", "is_same_cells_present", "spawn_items", "create_field_cells"]
+# "array" is the default engine path: cached label map and same pairs counter
+ENGINE_BACKENDS = ["array"] + list(BACKENDS)
+
+
+def restore(field, snapshot):
+    """Puts engine cells back to snapshot and syncs view cells which differ"""
+    field.move_timer.stop()
+    before = field.engine.cells.copy()
+    changed = before != snapshot
+    ys, xs = np.nonzero(changed)
+    field.engine.set_cells(ys, xs, snapshot[changed])
+    field.sync_changes(before)
+
+
+def largest_group_cell(field):
+    labels, sizes, members, starts = field.engine.label_groups()
+    label = int(np.argmax(sizes))
+    return field.items[divmod(int(members[starts[label]]), field.WIDTH)]
+
+
+def time_call(setup, call, samples: int):
+    timings = []
+    for _ in range(samples):
+        setup()
+        start = perf_counter()
+        call()
+        timings.append(perf_counter() - start)
+    return timings
+
+
+def bench_operation(field, operation: str, samples: int):
+    snapshot = field.engine.cells.copy()
+    cell = largest_group_cell(field)
+    top_row = np.zeros_like(snapshot[0])
+
+    def fresh():
+        restore(field, snapshot)
+
+    def fresh_uncached():
+        restore(field, snapshot)
+        field.engine.board_changed()
+
+    def empty_top_row():
+        restore(field, snapshot)
+        field.engine.set_cells(np.zeros_like(top_row), np.arange(field.WIDTH), top_row)
+        field.sync_cells([0] * field.WIDTH, range(field.WIDTH))
+
+    cases = {
+        # Group search after a move, when labels are not cached yet
+        "find_same_items": (fresh_uncached, lambda: field.find_same_items(cell)),
+        "cell_clicked": (fresh, lambda: field.cell_clicked(cell)),
+        "is_same_cells_present": (fresh, field.is_same_cells_present),
+        "spawn_items": (empty_top_row, field.spawn_items),
+        "create_field_cells": (lambda: None, field.create_field_cells),
+    }
+    setup, call = cases[operation]
+    timings = time_call(setup, call, samples)
+    restore(field, snapshot)
+    return timings
+
+
+def samples_for(height: int, width: int, samples: int):
+    """Fewer samples on big boards to keep the suite runtime bounded"""
+    return max(3, min(samples, samples * 2500 // (height * width)))
+
+
+def run(sizes, colors_list, operations, samples: int, seed: int, backends=("array",)):
+    app = QCoreApplication.instance() or QCoreApplication([])
+    results = []
+    for height, width in sizes:
+        for colors in colors_list:
+            for backend in backends:
+                field = GameField(height, width, colors, backend=None if backend == "array" else backend, seed=seed)
+                field.loose.disconnect()
+                for operation in operations:
+                    timings = bench_operation(field, operation, samples_for(height, width, samples))
+                    results.append({
+                        "operation": operation,
+                        "backend": backend,
+                        "height": height,
+                        "width": width,
+                        "colors": colors,
+                        "samples": len(timings),
+                        "median_us": median(timings) * 1e6,
+                        "min_us": min(timings) * 1e6,
+                    })
+                    print(f"{operation:>22} {backend:>8} {height:>4}x{width:<4} colors {colors:>2}: "
+                          f"median {results[-1]['median_us']:>12.1f} us, min {results[-1]['min_us']:>12.1f} us",
+                          flush=True)
+    return {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def result_key(result):
+    return result["operation"], result.get("backend", "array"), result["height"], result["width"], result["colors"]
+
+
+def fastest_backends(results):
+    """Prints the fastest backend for every operation and board size"""
+    best = {}
+    for result in results:
+        operation, backend, height, width, colors = result_key(result)
+        key = (operation, height, width, colors)
+        if key not in best or result["median_us"] < best[key]["median_us"]:
+            best[key] = result
+    for (operation, height, width, colors), result in best.items():
+        print(f"{operation:>22} {height:>4}x{width:<4} colors {colors:>2}: fastest {result['backend']}")
+
+
+def result_label(result):
+    operation, backend, height, width, colors = result_key(result)
+    return f"{operation:>22} {backend:>8} {height:>4}x{width:<4} colors {colors:>2}"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark GameField hot paths")
+    parser.add_argument("--sizes", nargs="+", help="board sizes as HEIGHTxWIDTH, default: difficulties, 50, 100, 500")
+    parser.add_argument("--colors", nargs="+", type=int, default=COLORS)
+    parser.add_argument("--operations", nargs="+", choices=OPERATIONS, default=OPERATIONS)
+    parser.add_argument("--backends", nargs="+", choices=ENGINE_BACKENDS, default=["array"],
+                        help="engine storage backends to compare")
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON file to save results to")
+    parser.add_argument("--compare", help="JSON file with baseline results")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative slowdown of median reported as regression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = SIZES
+    if args.sizes:
+        sizes = [parse_size(size) for size in args.sizes]
+
+    current = run(sizes, args.colors, args.operations, args.samples, args.seed, args.backends)
+    if len(args.backends) > 1:
+        fastest_backends(current["results"])
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+
+    if args.compare:
+        return check_baseline(args.compare, current, args.threshold, key=result_key, label=result_label,
+                              field="median_us", unit="us")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+"""Helpers shared by benchmark and report scripts"""
+import json
+
+
+def parse_size(size: str):
+    """Parses board size given as HEIGHTxWIDTH or a single side of a square board"""
+    height, _, width = size.lower().partition("x")
+    return int(height), int(width or height)
+
+
+def compare(baseline, current, threshold: float, key, label, field: str, unit: str):
+    """Prints ratio of current to baseline values of field for results matched by key(result),
+    label(result) names a result in the output. Returns list of results slower than threshold"""
+    baseline_results = {key(r): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        base = baseline_results.get(key(result))
+        if base is None:
+            continue
+        ratio = result[field] / base[field]
+        regressed = ratio > 1 + threshold
+        if regressed:
+            regressions.append(result)
+        print(f"{label(result)}: {base[field]:>12.1f} -> {result[field]:>12.1f} {unit}  x{ratio:.2f}"
+              f"{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def check_baseline(path: str, current, threshold: float, **compare_args):
+    """Compares current results with the baseline JSON file, returns exit code 1 when something regressed"""
+    with open(path) as f:
+        baseline = json.load(f)
+    regressions = compare(baseline, current, threshold, **compare_args)
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {threshold:.0%}")
+        return 1
+    return 0
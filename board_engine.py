@@ -0,0 +1,366 @@
+from random import getrandbits
+
+import numpy as np
+
+from replay import ReplayLog
+from tableContainer import BACKENDS
+
+
+class BoardEngine:
+    """Headless game board: packed int8 array of color indexes, 0 is an empty cell.
+
+    With a backend from tableContainer.BACKENDS the board is mirrored into that container
+    and group search and loss check are done by it instead of the cached label map and pairs counter,
+    which are not kept then. The array stays the buffer falls and column shifts are computed on.
+
+    Colors are drawn from the engine's own NumPy generator seeded with seed, a row or the whole
+    board in one call, so a game is fully defined by its seed and moves.
+    With record_replay set every fill starts a new ReplayLog of the game.
+    """
+    EMPTY = 0
+    # Group lookups repeated over one board, like hover, label the whole board only up to this many cells
+    LOCAL_SEARCH_CELLS = 10000
+    # Writes of up to this many cells keep the pairs counter with Python ints, cheaper than array calls
+    SCALAR_WRITE_CELLS = 64
+
+    def __init__(self, height: int, width: int, colors: int, items_in_line: int = 2, backend: str = None,
+                 seed: int = None):
+        self.height = height
+        self.width = width
+        self.colors_count = colors
+        self.items_in_line = items_in_line
+        self.cells = np.zeros((height, width), dtype=np.int8)
+        self.table = BACKENDS[backend](height, width) if backend else None
+        self.same_pairs = 0
+        self._groups = None
+        self.record_replay = False
+        self.replay_log = None
+        # Object with touch(flat_cells, before) called by set_cells before cells are overwritten,
+        # e.g. history.UndoHistory, None when nothing listens
+        self.write_listener = None
+        self.reseed(seed)
+
+    def reseed(self, seed: int = None):
+        """Restarts color generator, a random seed is picked when none is given"""
+        self.seed = getrandbits(32) if seed is None else seed
+        self.rng = np.random.default_rng(self.seed)
+
+    def board_changed(self):
+        """Drops cached data computed from the board, called by set_cells on every change"""
+        self._groups = None
+
+    def random_colors(self, shape):
+        return self.rng.integers(1, self.colors_count + 1, size=shape, dtype=np.int8)
+
+    def fill(self):
+        if self.record_replay:
+            self.replay_log = ReplayLog(self.seed, self.height, self.width, self.colors_count, self.items_in_line)
+        self.cells[:] = self.random_colors(self.cells.shape)
+        self.board_loaded()
+
+    def load_cells(self, cells):
+        """Replaces the whole board, e.g. with a stored snapshot. The game is no longer replayable from its seed"""
+        self.replay_log = None
+        self.cells[:] = cells
+        self.board_loaded()
+
+    def board_loaded(self):
+        """Mirrors the whole board into the backend or recounts same-color pairs"""
+        if self.table is not None:
+            for y, row in enumerate(self.cells.tolist()):
+                for x, value in enumerate(row):
+                    self.table[y, x] = value
+        else:
+            self.same_pairs = self.count_same_pairs()
+        self.board_changed()
+
+    def set_cells(self, ys, xs, values):
+        """Writes values to cells, keeping count of adjacent same-color pairs or the backend up to date"""
+        if self.table is None and len(ys) <= self.SCALAR_WRITE_CELLS:
+            self._set_few_cells(ys, xs, values)
+            return
+        ys = np.asarray(ys, dtype=np.intp)
+        xs = np.asarray(xs, dtype=np.intp)
+        values = np.broadcast_to(np.asarray(values, dtype=np.int8), ys.shape)
+        changed = self.cells[ys, xs] != values
+        if not changed.any():
+            return
+        ys, xs, values = ys[changed], xs[changed], values[changed]
+
+        if self.write_listener is not None:
+            self.write_listener.touch(ys * self.width + xs, self.cells[ys, xs])
+        if self.table is not None:
+            self.cells[ys, xs] = values
+            for y, x, value in zip(ys.tolist(), xs.tolist(), values.tolist()):
+                self.table[y, x] = value
+        else:
+            h_edges, v_edges = self._edges_around(ys, xs)
+            self.same_pairs -= self._count_pairs(h_edges, v_edges)
+            self.cells[ys, xs] = values
+            self.same_pairs += self._count_pairs(h_edges, v_edges)
+        self.board_changed()
+
+    def _set_few_cells(self, ys, xs, values):
+        """set_cells for a few cells, done on Python ints"""
+        flat = self.cells.ravel()
+        get = flat.item
+        height, width = self.height, self.width
+        if np.ndim(values) == 0:
+            values = [int(values)] * len(ys)
+        elif isinstance(values, np.ndarray):
+            values = values.tolist()
+        if isinstance(ys, np.ndarray):
+            ys = ys.tolist()
+        if isinstance(xs, np.ndarray):
+            xs = xs.tolist()
+        writes = [(y * width + x, value) for y, x, value in zip(ys, xs, values) if get(y * width + x) != value]
+        if not writes:
+            return
+
+        h_edges = set()
+        v_edges = set()
+        for i, _ in writes:
+            y, x = divmod(i, width)
+            if x + 1 < width:
+                h_edges.add(i)
+            if x > 0:
+                h_edges.add(i - 1)
+            if y + 1 < height:
+                v_edges.add(i)
+            if y > 0:
+                v_edges.add(i - width)
+
+        def count_pairs():
+            count = 0
+            for i in h_edges:
+                value = get(i)
+                if value != self.EMPTY and value == get(i + 1):
+                    count += 1
+            for i in v_edges:
+                value = get(i)
+                if value != self.EMPTY and value == get(i + width):
+                    count += 1
+            return count
+
+        if self.write_listener is not None:
+            self.write_listener.touch([i for i, _ in writes], [get(i) for i, _ in writes])
+        self.same_pairs -= count_pairs()
+        for i, value in writes:
+            flat[i] = value
+        self.same_pairs += count_pairs()
+        self.board_changed()
+
+    def _edges_around(self, ys, xs):
+        """Returns flat indexes of first cells of horizontal and vertical pairs containing given cells"""
+        height, width = self.height, self.width
+        # Pairs are marked on board-sized masks, so every pair is counted once without sorting
+        h_mask = np.zeros((height, width), dtype=bool)
+        h_mask[ys, xs] = True
+        h_mask[ys, np.maximum(xs - 1, 0)] = True
+        h_mask[:, -1] = False
+        v_mask = np.zeros((height, width), dtype=bool)
+        v_mask[ys, xs] = True
+        v_mask[np.maximum(ys - 1, 0), xs] = True
+        v_mask[-1, :] = False
+        return np.flatnonzero(h_mask), np.flatnonzero(v_mask)
+
+    def _count_pairs(self, h_edges, v_edges):
+        flat = self.cells.ravel()
+        left, right = flat[h_edges], flat[h_edges + 1]
+        top, bottom = flat[v_edges], flat[v_edges + self.width]
+        return (np.count_nonzero((left == right) & (left != self.EMPTY)) +
+                np.count_nonzero((top == bottom) & (top != self.EMPTY)))
+
+    def count_same_pairs(self):
+        """Counts adjacent pairs of same color over the whole board"""
+        cells = self.cells
+        filled = cells != self.EMPTY
+        return int(np.count_nonzero((cells[:, 1:] == cells[:, :-1]) & filled[:, 1:]) +
+                   np.count_nonzero((cells[1:, :] == cells[:-1, :]) & filled[1:, :]))
+
+    def label_groups(self):
+        """Labels every same-color group of the board in one pass.
+
+        Returns (labels, sizes, members, starts): label of each cell, size of each label
+        (0 for empty cells), flat indexes of cells sorted by label and offset of each label in it
+        """
+        if self._groups is not None:
+            return self._groups
+
+        cells = self.cells
+        height, width = cells.shape
+        index = np.arange(cells.size).reshape(height, width)
+        filled = cells != self.EMPTY
+        same_h = (cells[:, 1:] == cells[:, :-1]) & filled[:, 1:]
+        same_v = (cells[1:, :] == cells[:-1, :]) & filled[1:, :]
+        a = np.concatenate((index[:, :-1][same_h], index[:-1, :][same_v]))
+        b = np.concatenate((index[:, 1:][same_h], index[1:, :][same_v]))
+
+        # Union-find with hooking of larger root onto smaller one and pointer jumping
+        parent = np.arange(cells.size)
+        while True:
+            root_a, root_b = parent[a], parent[b]
+            joined = root_a != root_b
+            if not joined.any():
+                break
+            root_a, root_b = root_a[joined], root_b[joined]
+            np.minimum.at(parent, np.maximum(root_a, root_b), np.minimum(root_a, root_b))
+            while True:
+                grandparent = parent[parent]
+                if np.array_equal(grandparent, parent):
+                    break
+                parent = grandparent
+            a, b = a[joined], b[joined]
+
+        roots, labels, counts = np.unique(parent, return_inverse=True, return_counts=True)
+        sizes = np.where(filled.ravel()[roots], counts, 0)
+        members = np.argsort(labels, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)))
+        self._groups = (labels.reshape(height, width), sizes, members, starts)
+        return self._groups
+
+    def is_local_search(self):
+        """True when repeated group lookups should flood-fill single groups instead of labeling the board"""
+        return self._groups is None and self.cells.size > self.LOCAL_SEARCH_CELLS
+
+    def flood_fill(self, y: int, x: int):
+        """Returns list of (y, x) of the group of the cell, visiting only the group and its border"""
+        cells = self.cells
+        color = cells.item(y, x)
+        if color == self.EMPTY:
+            return []
+        height, width = cells.shape
+        same_items = [(y, x)]
+        seen = {(y, x)}
+        for cy, cx in same_items:
+            for ny, nx in ((cy, cx + 1), (cy + 1, cx), (cy, cx - 1), (cy - 1, cx)):
+                if 0 <= ny < height and 0 <= nx < width and (ny, nx) not in seen:
+                    seen.add((ny, nx))
+                    if cells.item(ny, nx) == color:
+                        same_items.append((ny, nx))
+        return same_items
+
+    def group_size(self, y: int, x: int):
+        if self.table is not None:
+            return len(self.table.find_same_items(y, x))
+        if self._groups is None:
+            return len(self.flood_fill(y, x))
+        labels, sizes, _, _ = self.label_groups()
+        return int(sizes[labels[y, x]])
+
+    def group_score(self, y: int, x: int):
+        """Scores which would be added by clicking the cell"""
+        size = self.group_size(y, x)
+        return size * size if size >= self.items_in_line else 0
+
+    def find_same_items(self, y: int, x: int):
+        """Returns list of (y, x) of the group of same color connected to given cell"""
+        if self.table is not None:
+            return self.table.find_same_items(y, x)
+        if self.cells[y, x] == self.EMPTY:
+            return []
+        if self._groups is None:
+            return self.flood_fill(y, x)
+        labels, _, members, starts = self.label_groups()
+        label = labels[y, x]
+        group = members[starts[label]:starts[label + 1]]
+        ys, xs = np.divmod(group, self.width)
+        return list(zip(ys.tolist(), xs.tolist()))
+
+    def _dropped(self, block):
+        """Returns copy of block of columns with items fallen down to the bottom"""
+        order = np.argsort(block != self.EMPTY, axis=0, kind="stable")
+        return np.take_along_axis(block, order, axis=0)
+
+    def _compacted(self, block):
+        """Returns copy of block with non-empty columns shifted to the right"""
+        order = np.argsort(block.any(axis=0), kind="stable")
+        return block[:, order]
+
+    def _write_block(self, block, x_start: int = 0):
+        """Writes block of columns starting at x_start, only changed cells are touched"""
+        changed = block != self.cells[:, x_start:x_start + block.shape[1]]
+        ys, xs = np.nonzero(changed)
+        self.set_cells(ys, xs + x_start, block[changed])
+        return ys, xs + x_start
+
+    def drop_items(self, columns):
+        """Drops items down to the bottom in given columns"""
+        columns = np.fromiter(columns, dtype=np.intp)
+        block = self.cells[:, columns]
+        dropped = self._dropped(block)
+        changed = dropped != block
+        ys, xs = np.nonzero(changed)
+        self.set_cells(ys, columns[xs], dropped[changed])
+
+    def collapse(self, columns):
+        """Drops items in given columns and compacts columns up to the rightmost of them in one pass"""
+        columns = np.fromiter(columns, dtype=np.intp)
+        block = self.cells[:, :columns.max() + 1].copy()
+        block[:, columns] = self._dropped(block[:, columns])
+        self._write_block(self._compacted(block))
+
+    def clear_items(self, same_items):
+        ys, xs = zip(*same_items)
+        if self.replay_log is not None:
+            self.replay_log.clear(ys[0], xs[0], len(same_items))
+        self.set_cells(ys, xs, self.EMPTY)
+        self.collapse(set(xs))
+
+    def spawn_row(self, n: int = 0):
+        """Puts new items into empty cells of top row, returns columns where items were placed"""
+        if n == 0:
+            n = self.width
+        spawned = np.flatnonzero(self.cells[0, :n] == self.EMPTY)
+        if self.replay_log is not None:
+            self.replay_log.spawn(n)
+        self.set_cells(np.zeros_like(spawned), spawned, self.random_colors(len(spawned)))
+        return spawned.tolist()
+
+    def spawn_items(self, n: int = 0):
+        """Spawns a row and lets it fall down instantly"""
+        spawned = self.spawn_row(n)
+        self.drop_items(spawned)
+        return spawned
+
+    def fall_step(self):
+        """Moves every item having an empty cell anywhere below it one cell down.
+        Returns (ys, xs) of changed cells, empty when everything has landed"""
+        cells = self.cells
+        empty = cells == self.EMPTY
+        empty_below = np.zeros_like(empty)
+        empty_below[:-1] = np.logical_or.accumulate(empty[:0:-1], axis=0)[::-1]
+        falling = ~empty & empty_below
+        if not falling.any():
+            return np.nonzero(falling)
+
+        ys, xs = np.nonzero(falling)
+        block = cells.copy()
+        block[falling] = self.EMPTY
+        block[ys + 1, xs] = cells[ys, xs]
+        return self._write_block(block)
+
+    def settle(self):
+        """Lands every falling item at once, returns (ys, xs) of changed cells"""
+        board_before = self.cells.copy()
+        self.drop_items(range(self.width))
+        return np.nonzero(board_before != self.cells)
+
+    def is_top_row_empty(self):
+        return not self.cells[0, :].any()
+
+    def click(self, y: int, x: int):
+        """Headless move: clears group, collapses board and spawns a new row if needed.
+        Returns count of cleared items"""
+        same_items = self.find_same_items(y, x)
+        if len(same_items) < self.items_in_line:
+            return 0
+        self.clear_items(same_items)
+        if self.is_top_row_empty():
+            self.spawn_items()
+        return len(same_items)
+
+    def is_same_cells_present(self):
+        if self.table is not None:
+            return self.table.is_same_cells_present()
+        return self.same_pairs > 0
@@ -1,17 +1,22 @@
-from random import sample, choice
+from contextlib import contextmanager
+from random import Random
+from time import perf_counter
 
 import numpy as np
-from PyQt5.QtCore import QObject, pyqtSignal, QTimer, QPoint, QRect
-from enums import CoordinatesMoves
+from PyQt5.QtCore import QObject, pyqtSignal, QTimer
+from board_engine import BoardEngine
+from history import UndoHistory
+from snapshot import Snapshots, SnapshotWriter
 from tableContainer import NpTableContainer
 
 
-class GameItem(QObject):
+class GameItem:
     ''' Ball with color and status '''
+    __slots__ = ("color", "_cell")
 
     def __init__(self, color, cell=None):
-        super(GameItem, self).__init__()
         self.color = color
+        self._cell = None
         self.cell = cell
 
     @property
@@ -20,18 +25,16 @@ class GameItem(QObject):
 
     @cell.setter
     def cell(self, cell):
-        self._cell = cell
-        if cell is None and self._cell:
-            del self.item
-            return
-        if cell:
-            if cell.item != self:
-                cell.item = self
+        # GameCell.item setter keeps both sides of the link
+        if cell is None:
+            del self.cell
+        elif cell.item is not self:
+            cell.item = self
 
     @cell.deleter
     def cell(self):
-        self._cell.item = None
-        self._cell = None
+        if self._cell is not None:
+            self._cell.item = None
 
     def __str__(self):
         in_cell = "" if not self.cell else f" in cell {self.cell}"
@@ -41,20 +44,19 @@ class GameItem(QObject):
         return f"GameItem('{self.color}', {self.cell})"
 
 
-class GameCell(QObject):
-    """Contains blueprint of a cell on game field"""
-    changed = pyqtSignal()
-    next_color = pyqtSignal(object)
+class GameCell:
+    """Contains blueprint of a cell on game field.
+    Plain object, its changes are reported by board_changed signal of the field"""
+    __slots__ = ("parent_field", "y", "x", "_item", "active")
 
     def __init__(self, parent_field, y: int, x: int, item: GameItem = None):
-        super(GameCell, self).__init__()
         self.parent_field = parent_field
-        parent_field.field_was_reset.connect(self.reset)
         self.x = x
         self.y = y
-        self.item = item
-        self.changed.emit()
-        self._active = False
+        self._item = item
+        if item is not None:
+            item._cell = self
+        self.active = False
 
     @property
     def item(self):
@@ -62,27 +64,24 @@ class GameCell(QObject):
 
     @item.setter
     def item(self, item):
+        if self._item is not None and self._item.cell is self:
+            self._item._cell = None
         self._item = item
-        if item is None and self._item:
-            del self.item
-            return
-
-        if item and item.cell != self._item:
-            item.cell = self
-        self.changed.emit()
+        if item is not None:
+            item._cell = self
+        self.notify_changed()
 
     @item.deleter
     def item(self):
-        del self._item.cell
-        self._item = None
-
-        self.changed.emit()
-
-    def reset(self):
         self.item = None
-        self.active = False
-        self.next_color.emit(None)
-        self.changed.emit()
+
+    def notify_changed(self):
+        """Emits board_changed of the field, or marks cell dirty if the field is in batch update"""
+        field = self.parent_field
+        if field.is_batching():
+            field.dirty_cells.add((self.y, self.x))
+        else:
+            field._emit(field.board_changed, [(self.y, self.x)])
 
     def __str__(self):
         return f"GameCell({self.y},{self.x})"
@@ -106,185 +105,374 @@ class GameField(QObject):
     cells_cleared = pyqtSignal(int)
     item_moved = pyqtSignal()
     loose = pyqtSignal()
-
-    def __init__(self, height: int = 0, width: int = 0, colors=COLORS_ON_FIELD):
+    board_changed = pyqtSignal(list)
+    # Every cell may have changed, sent instead of board_changed with a list of all cells
+    board_replaced = pyqtSignal()
+    animation_finished = pyqtSignal()
+    score_changed = pyqtSignal(int)
+    history_changed = pyqtSignal()
+    groups_changed = pyqtSignal()
+    # Sent on reset of a game with at least one move, with game_record() of it
+    game_finished = pyqtSignal(dict)
+
+    def __init__(self, height: int = 0, width: int = 0, colors=COLORS_ON_FIELD, backend: str = None,
+                 seed: int = None):
         super(GameField, self).__init__()
 
-        self.field_colors = sample(self.COLORS, colors)
-        # self.field_colors = sample(self.COLORS, len(self.COLORS))
+        # Seeds palette and every game on this field, each game gets its own seed from it
+        self.seeds = Random(seed)
+        self.field_colors = self.seeds.sample(self.COLORS, colors)
         if width != 0:
             self.WIDTH = width
         if height != 0:
             self.HEIGHT = height
+        self.engine = BoardEngine(self.HEIGHT, self.WIDTH, colors, self.ITEMS_IN_LINE, backend,
+                                  seed=self.seeds.getrandbits(32))
+        self.engine.record_replay = True
+        self.history = UndoHistory()
+        self.engine.write_listener = self.history
         self.items = NpTableContainer(self.HEIGHT, self.WIDTH)
+        # GameItems taken off the board, reused instead of allocating new ones
+        self.free_items = []
+        self._batch_depth = 0
+        self.dirty_cells = set()
+        self.all_dirty = False
+        # MoveProfiler collecting per-move timings, None when profiling is off
+        self.profiler = None
+        # Labels of groups for hover preview, rebuilt on first lookup after the board changes
+        self.group_index = None
+        # On big boards only the hovered group is searched, it is kept as (label, size, sorted members)
+        self.hover_group = None
+        for signal in (self.cells_cleared, self.items_were_spawned, self.field_was_reset,
+                       self.animation_finished, self.history_changed):
+            signal.connect(self.invalidate_group_index)
         self.create_field_cells()
         self.move_timer = QTimer()
+        self.move_timer.setInterval(self.MOVE_SPEED_MS)
+        self.move_timer.timeout.connect(self.animation_tick)
 
         self.loose.connect(self.reset)
 
     def find_filled_cells(self):
-        cells = np.ravel(self.items)
-        empty_cells = [c for c in cells if c.item is not None]
-        return empty_cells
+        ys, xs = np.nonzero(self.engine.cells != BoardEngine.EMPTY)
+        return [self.items[y, x] for y, x in zip(ys, xs)]
 
     def find_empty_cells(self):
-        cells = np.ravel(self.items)
-        empty_cells = [c for c in cells if c.item is None]
-        return empty_cells
+        ys, xs = np.nonzero(self.engine.cells == BoardEngine.EMPTY)
+        return [self.items[y, x] for y, x in zip(ys, xs)]
+
+    def _emit(self, signal, *args):
+        """Emits a signal of the field, counted by the profiler"""
+        if self.profiler is not None:
+            self.profiler.count("signals_emitted")
+        signal.emit(*args)
+
+    def is_batching(self):
+        return self._batch_depth > 0
+
+    @contextmanager
+    def batch_update(self):
+        """Holds back cell notifications, then emits board_changed once with (y, x) of changed cells"""
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self.all_dirty:
+                self.all_dirty = False
+                self.dirty_cells = set()
+                if self.profiler is not None:
+                    self.profiler.count("cells_changed", self.engine.cells.size)
+                self._emit(self.board_replaced)
+            elif self._batch_depth == 0 and self.dirty_cells:
+                dirty_cells = list(self.dirty_cells)
+                self.dirty_cells = set()
+                if self.profiler is not None:
+                    self.profiler.count("cells_changed", len(dirty_cells))
+                self._emit(self.board_changed, dirty_cells)
+
+    def sync_cells(self, ys, xs):
+        """Updates GameCell/GameItem view of given cells from engine state"""
+        board = self.engine.cells
+        for y, x in zip(ys, xs):
+            cell = self.items[y, x]
+            color_index = board[y, x]
+            item = cell.item
+            if color_index == BoardEngine.EMPTY:
+                if item is not None:
+                    cell.item = None
+                    self.free_items.append(item)
+                continue
+            color = self.field_colors[color_index - 1]
+            if item is None:
+                if self.free_items:
+                    item = self.free_items.pop()
+                    item.color = color
+                else:
+                    item = GameItem(color)
+                cell.item = item
+            elif item.color != color:
+                # Balls are recolored in place, so a new game allocates nothing
+                item.color = color
+                cell.notify_changed()
+
+    def sync_all(self):
+        """Updates every GameCell/GameItem from engine state in one batch, with no per-cell notifications"""
+        colors = [None] + self.field_colors
+        free_items = self.free_items
+        with self.batch_update():
+            for cell, color_index in zip(self.items().ravel().tolist(), self.engine.cells.ravel().tolist()):
+                item = cell._item
+                if color_index == BoardEngine.EMPTY:
+                    if item is not None:
+                        cell._item = item._cell = None
+                        free_items.append(item)
+                elif item is None:
+                    item = free_items.pop() if free_items else GameItem(None)
+                    item.color = colors[color_index]
+                    cell._item = item
+                    item._cell = cell
+                else:
+                    item.color = colors[color_index]
+            self.all_dirty = True
+
+    def sync_changes(self, board_before):
+        ys, xs = np.nonzero(board_before != self.engine.cells)
+        self.sync_cells(ys, xs)
 
     def create_field_cells(self):
-        for y in range(self.HEIGHT):
-            for x in range(self.WIDTH):
-                if self.items[y, x] is None:
-                    self.items[y, x] = GameCell(self, y, x)
-                item = GameItem(choice(self.field_colors))
-                self.items[y, x].item = item
+        if self.items[0, 0] is None:
+            cells = np.empty(self.HEIGHT * self.WIDTH, dtype=object)
+            cells[:] = [GameCell(self, y, x) for y in range(self.HEIGHT) for x in range(self.WIDTH)]
+            self.items()[:] = cells.reshape(self.HEIGHT, self.WIDTH)
+        self.engine.fill()
+        self.history.clear()
+        self._emit(self.history_changed)
+        self.score = 0
+        self.moves = 0
+        self.game_started = perf_counter()
+        self.sync_all()
+
+    def save_snapshot(self, path: str):
+        """Saves board, palette, score and moves as a bit-packed snapshot file of one record"""
+        with SnapshotWriter(path, self.HEIGHT, self.WIDTH, len(self.field_colors)) as writer:
+            writer.write(self.engine.cells, [self.COLORS.index(color) for color in self.field_colors],
+                         self.score, self.moves)
+
+    def load_snapshot(self, path: str, index: int = 0):
+        """Loads a record of a snapshot file made for a field of the same size"""
+        snapshots = Snapshots(path)
+        if (snapshots.height, snapshots.width) != (self.HEIGHT, self.WIDTH):
+            raise ValueError(f"Snapshot of {snapshots.height}x{snapshots.width} board "
+                             f"does not fit {self.HEIGHT}x{self.WIDTH} field")
+        self.move_timer.stop()
+        with self.batch_update():
+            self.field_colors = [self.COLORS[i] for i in snapshots.palette(index)]
+            self.engine.colors_count = len(self.field_colors)
+            self.engine.load_cells(snapshots.cells(index))
+            self.history.clear()
+            self._emit(self.history_changed)
+            self.score = snapshots.score(index)
+            self.moves = snapshots.moves(index)
+            self.game_started = perf_counter()
+            # Palette may differ, so every cell is synced
+            self.sync_all()
+        self.start_animation()
+
+    def settle(self):
+        """Finishes falling animation at once"""
+        if not self.is_animating():
+            return
+        self.move_timer.stop()
+        with self.batch_update():
+            ys, xs = self.engine.settle()
+            self.sync_cells(ys, xs)
+        self._emit(self.animation_finished)
+
+    def begin_move(self):
+        """Lands falling items and opens a new undo entry, which will get every change up to the next move"""
+        self.settle()
+        self.history.begin(self.engine.cells, (self.score, self.moves))
+        self._emit(self.history_changed)
+
+    def apply_delta(self, cells, values, state):
+        with self.batch_update():
+            ys, xs = np.divmod(cells, self.WIDTH)
+            self.engine.set_cells(ys, xs, values)
+            self.sync_cells(ys, xs)
+        # Colors drawn after undo differ from the recorded game
+        self.engine.replay_log = None
+        self.score, self.moves = state
+        self._emit(self.score_changed, self.score)
+        self._emit(self.history_changed)
+
+    def undo(self):
+        self.settle()
+        delta = self.history.undo(self.engine.cells, (self.score, self.moves))
+        if delta is not None:
+            self.apply_delta(delta.cells, delta.before, delta.state_before)
+
+    def redo(self):
+        self.settle()
+        delta = self.history.redo()
+        if delta is not None:
+            self.apply_delta(delta.cells, delta.after, delta.state_after)
 
     def spawn_items(self, n: int = 0):
-        if n == 0:
-            n = self.WIDTH
+        self.begin_move()
+        self.spawn_row(n)
 
-        for x in range(n):
-            item = GameItem(choice(self.field_colors))
-            cell = self.items[0, x]
-            if cell.item is None:
-                cell.item = item
-                self.move_item(cell)
-        self.items_were_spawned.emit()
+    def spawn_row(self, n: int = 0):
+        with self.batch_update():
+            spawned = self.engine.spawn_row(n)
+            self.sync_cells([0] * len(spawned), spawned)
+        if spawned:
+            self.start_animation()
+        self._emit(self.items_were_spawned)
 
     def is_same_cells_present(self):
-
-        np_colors = np.vectorize(lambda x: x.item.color if x.item else "None")
-        # Shift, axis (Right, Down, Left, Up)
-        possible_moves = [(1, 1), (1, 0), (-1, 1), (-1, 0)]
-        current_colors = np_colors(self.items)
-        for move in possible_moves:
-            shifted_items = np_colors(np.roll(self.items, move[0], move[1]))
-            if move[0] > 0:
-                element_to_clear = 0
-            elif move[0] < 0:
-                element_to_clear = -1
-
-            if move[1] == 0:
-                shifted_items[element_to_clear, :] = "None"
-            elif move[1] == 1:
-                shifted_items[:, element_to_clear] = "None"
-
-            if np.any((current_colors == shifted_items) & (current_colors != "None") & (shifted_items != "None")):
-                return True
-        return False
-
-        # print(current_colors)
-
-    def move_item(self, cell, second_try: bool = False):
-        current_cell = cell
-        next_cell = None
-        if cell.x != 0:
-            cells_on_left = self.items[:, cell.x]
-            left_row_filled_cells = sum([c.item is not None for c in cells_on_left])
-            if left_row_filled_cells == 0:
-                for x in range(cell.x, 0, -1):
-                    for moved_cell in self.items[:, x]:
-                        moved_cell.item = self.items[moved_cell.y, x - 1].item
-                for moved_cell in self.items[:, 0]:
-                    moved_cell.item = None
-        try:
-            next_cell = self.items[cell.y + 1, cell.x]
-        except Exception as e:
-            pass
-
-        if next_cell:
-            if next_cell.item:
-                if sum([c.item is None for c in self.items[cell.y:, cell.x]]) > 0:
-                    second_try = False
-
-                if not second_try:
-                    self.move_timer.singleShot(self.MOVE_SPEED_MS * 2,
-                                               lambda self=self, cell=cell: self.move_item(cell, True))
-                    return
-                else:
-                    return
-            next_cell.item = current_cell.item
-            current_cell.item = None
-            self.item_moved.emit()
-            self.move_timer.singleShot(self.MOVE_SPEED_MS,
-                                       lambda self=self, next_cell=next_cell: self.move_item(next_cell))
+        return self.engine.is_same_cells_present()
+
+    def check_loose(self):
+        """Emits loose if no moves are left, the check is postponed while items are falling"""
+        if not self.is_animating() and not self.is_same_cells_present():
+            print("You loose!")
+            self._emit(self.loose)
+
+    def is_animating(self):
+        return self.move_timer.isActive()
+
+    def start_animation(self):
+        if not self.move_timer.isActive():
+            self.move_timer.start()
+
+    def animation_tick(self):
+        """Advances every falling item one cell down, all moves are applied in one batch"""
+        profiler = self.profiler
+        if profiler is not None:
+            start = perf_counter()
+            profiler.count("frames")
+
+        with self.batch_update():
+            ys, xs = self.engine.fall_step()
+            self.sync_cells(ys, xs)
+
+        if len(ys):
+            # Groups under falling items change every frame
+            self.invalidate_group_index()
+            self._emit(self.item_moved)
+        else:
+            self.move_timer.stop()
+            self._emit(self.animation_finished)
+            self.check_loose()
+
+        if profiler is not None:
+            profiler.add("animation", perf_counter() - start)
+
+    def game_record(self):
+        """Board parameters, seed, score and stats of the current game, as arguments of ScoreStore.row"""
+        replay_log = self.engine.replay_log
+        return {
+            "height": self.HEIGHT,
+            "width": self.WIDTH,
+            "colors": self.engine.colors_count,
+            "items_in_line": self.ITEMS_IN_LINE,
+            "seed": self.engine.seed,
+            "score": self.score,
+            "moves": self.moves,
+            "duration": perf_counter() - self.game_started,
+            "replay": replay_log.to_bytes() if replay_log is not None and replay_log.moves else None,
+        }
 
     def reset(self):
-        self.field_colors = sample(self.COLORS, self.COLORS_ON_FIELD)
-        self.field_was_reset.emit()
-        self.create_field_cells()
+        if self.moves:
+            self._emit(self.game_finished, self.game_record())
+        self.field_colors = self.seeds.sample(self.COLORS, self.COLORS_ON_FIELD)
+        self.engine.colors_count = len(self.field_colors)
+        self.engine.reseed(self.seeds.getrandbits(32))
+        self.move_timer.stop()
+        with self.batch_update():
+            self._emit(self.field_was_reset)
+            self.create_field_cells()
+
+    def invalidate_group_index(self):
+        self.group_index = None
+        self.hover_group = None
+        self._emit(self.groups_changed)
+
+    def group_at(self, y: int, x: int):
+        """Returns (label, size, flat indexes of members) of the group of the cell from the group index,
+        which is dropped on every event changing the board and on every animation frame"""
+        if self.group_index is None and self.engine.is_local_search():
+            return self.local_group_at(y, x)
+        if self.group_index is None:
+            self.group_index = self.engine.label_groups()
+        labels, sizes, members, starts = self.group_index
+        label = int(labels[y, x])
+        return label, int(sizes[label]), members[starts[label]:starts[label + 1]]
+
+    def local_group_at(self, y: int, x: int):
+        """group_at for boards where labeling every group takes too long: the group of the cell
+        is flood-filled and reused while the cursor stays in it, its label is its first flat index"""
+        flat = y * self.WIDTH + x
+        if self.hover_group is not None:
+            members = self.hover_group[2]
+            i = np.searchsorted(members, flat)
+            if i < len(members) and members[i] == flat:
+                return self.hover_group
+        same_items = self.engine.flood_fill(y, x)
+        if not same_items:
+            return -1, 0, np.zeros(0, dtype=np.intp)
+        members = np.sort(np.ravel_multi_index(tuple(np.array(same_items).T), self.engine.cells.shape))
+        self.hover_group = (int(members[0]), len(members), members)
+        return self.hover_group
+
+    def score_preview(self, cell):
+        """Scores which clicking the cell would give, taken from cached group labels"""
+        return self.engine.group_score(cell.y, cell.x)
 
     def find_same_items(self, cell):
-        moves = CoordinatesMoves
-        possible_moves = [moves.RIGHT, moves.DOWN, moves.LEFT, moves.UP]
-        directions = [QPoint(m.value[1], m.value[0]) for m in possible_moves]
-
-        rect = QRect(0, 0, self.WIDTH, self.HEIGHT)
-
-        same_items = [cell]
-        same_items_set = {str(cell)}
-
-        for current_cell in same_items:
-            added_cells = []
-            for d in directions:
-                new_point = QPoint(current_cell.x + d.x(), current_cell.y + d.y())
-                if not rect.contains(new_point):
-                    continue
-                else:
-                    new_cell = self.items[new_point.y(), new_point.x()]
-                    if not new_cell.item or str(new_cell) in same_items_set:
-                        continue
-
-                    if current_cell.item.color == new_cell.item.color:
-                        added_cells.append(new_cell)
-                        same_items_set.add(str(new_cell))
-            same_items.extend(added_cells)
-        return same_items
+        return [self.items[y, x] for y, x in self.engine.find_same_items(cell.y, cell.x)]
 
     def cell_clicked(self, cell):
-        if cell.item:
-            same_items = self.find_same_items(cell)
-            if len(same_items) >= self.ITEMS_IN_LINE:
-                lines_to_shift_down = set()
-                for removed_cell in same_items:
-                    removed_cell.item = None
-                    lines_to_shift_down.add(removed_cell.x)
-
-                for x in lines_to_shift_down:
-                    for y in range(self.HEIGHT - 1, 0, -1):
-                        if self.items[y, x].item:
-                            pass
-                        else:
-                            cells_above = [c.y for c in self.items[:y, x] if c.item]
-                            if len(cells_above) == 0:
-                                break
-
-                            nearest_filled_y = max(cells_above)
-                            self.items[y, x].item = self.items[nearest_filled_y, x].item
-                            self.items[nearest_filled_y, x].item = None
-
-                max_x = max(lines_to_shift_down)
-                for x in range(max_x, 0, -1):
-                    column = self.items[:, x]
-                    filled_cells_count = sum(c.item is not None for c in column)
-                    if filled_cells_count == 0:
-                        for xn in range(x - 1, -1, -1):
-                            column_n = self.items[:, xn]
-                            filled_cells_count_n = sum(c.item is not None for c in column_n)
-                            if filled_cells_count_n > 0:
-                                for shifted_cell in column:
-                                    shifted_cell.item = self.items[shifted_cell.y, xn].item
-                                    self.items[shifted_cell.y, xn].item = None
-                                break
-
-                top_row_filled_cells = sum([c.item is not None for c in self.items[0, :]])
-                if top_row_filled_cells == 0:
-                    self.spawn_items()
-
-                self.cells_cleared.emit(len(same_items))
-            # Item clicked has no same neighbours
-            else:
-                if not self.is_same_cells_present():
-                    print("You loose!")
-                    self.loose.emit()
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start_move(cell.y, cell.x)
+
+        # Every move starts on a landed board, so undo entries go from one settled board to another
+        self.settle()
+        if profiler is not None:
+            profiler.mark("animation")
+        same_items = self.engine.find_same_items(cell.y, cell.x)
+        if len(same_items) >= self.ITEMS_IN_LINE:
+            if profiler is not None:
+                profiler.mark("group_search")
+            self.begin_move()
+
+            with self.batch_update():
+                board_before = self.engine.cells.copy()
+                self.engine.clear_items(same_items)
+                if profiler is not None:
+                    profiler.mark("collapse")
+
+                self.sync_changes(board_before)
+                if self.engine.is_top_row_empty():
+                    self.spawn_row()
+                if profiler is not None:
+                    profiler.mark("view_sync")
+
+            self.score += len(same_items) * len(same_items)
+            self.moves += 1
+            self._emit(self.cells_cleared, len(same_items))
+            if profiler is not None:
+                profiler.mark("signals")
+            self.check_loose()
+        # Item clicked has no same neighbours
+        elif same_items:
+            if profiler is not None:
+                profiler.mark("group_search")
+            self.check_loose()
+
+        if profiler is not None:
+            profiler.mark("loss_check")
+            profiler.end_move()
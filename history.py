@@ -0,0 +1,116 @@
+from collections import deque
+
+import numpy as np
+
+
+class Delta:
+    """Cells changed by one move: flat indexes with values before and after it, plus caller state"""
+    __slots__ = ("cells", "before", "after", "state_before", "state_after")
+
+    # Rough size of the object and its arrays headers
+    OVERHEAD = 400
+
+    def __init__(self, cells, before, after, state_before, state_after):
+        self.cells = cells
+        self.before = before
+        self.after = after
+        self.state_before = state_before
+        self.state_after = state_after
+
+    @property
+    def nbytes(self):
+        return self.cells.nbytes + self.before.nbytes + self.after.nbytes + self.OVERHEAD
+
+
+class UndoHistory:
+    """Undo/redo stacks of board deltas.
+
+    An entry is opened with begin() and collects every cell write until the next begin() or undo(),
+    so falling animation after a move belongs to that move. Only the first value written over
+    a cell is kept, values after the move are read from the board when the entry is closed.
+    Oldest entries are dropped when the stacks take more than max_bytes.
+    """
+    MAX_BYTES = 16 * 1024 * 1024
+
+    def __init__(self, max_bytes: int = MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.nbytes = 0
+        self._cells = None
+        self._before = None
+        self._state = None
+
+    def touch(self, flat_cells, before):
+        """Records values of cells which are about to be overwritten"""
+        if self._cells is not None:
+            self._cells.append(np.asarray(flat_cells, dtype=np.int32))
+            self._before.append(np.asarray(before, dtype=np.int8))
+
+    def begin(self, board, state=None):
+        """Closes current entry and opens a new one, redo is no longer possible after a new move"""
+        self.close(board, state)
+        self._drop(self.redo_stack)
+        self._cells = []
+        self._before = []
+        self._state = state
+
+    def close(self, board, state=None):
+        """Turns recorded writes into a Delta on undo stack, board is the state after the move"""
+        if self._cells is None:
+            return
+        cells_chunks, before_chunks, state_before = self._cells, self._before, self._state
+        self._cells = self._before = self._state = None
+        if not cells_chunks:
+            return
+
+        cells = np.concatenate(cells_chunks)
+        before = np.concatenate(before_chunks)
+        # np.unique returns first occurrence of every cell, that is its value before the move
+        cells, first = np.unique(cells, return_index=True)
+        before = before[first]
+        after = board.ravel()[cells]
+        changed = before != after
+        if not changed.any() and state_before == state:
+            return
+        delta = Delta(cells[changed], before[changed], after[changed], state_before, state)
+        self.undo_stack.append(delta)
+        self.nbytes += delta.nbytes
+        self._evict()
+
+    def undo(self, board, state=None):
+        """Closes current entry and returns the last Delta to revert, None when there is nothing to undo"""
+        self.close(board, state)
+        if not self.undo_stack:
+            return None
+        delta = self.undo_stack.pop()
+        self.redo_stack.append(delta)
+        return delta
+
+    def redo(self):
+        """Returns the last undone Delta to apply again, None when there is nothing to redo"""
+        if self._cells is not None or not self.redo_stack:
+            return None
+        delta = self.redo_stack.pop()
+        self.undo_stack.append(delta)
+        return delta
+
+    def can_undo(self):
+        return bool(self.undo_stack) or self._cells is not None
+
+    def can_redo(self):
+        return self._cells is None and bool(self.redo_stack)
+
+    def clear(self):
+        self._cells = self._before = self._state = None
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.nbytes = 0
+
+    def _drop(self, stack):
+        self.nbytes -= sum(delta.nbytes for delta in stack)
+        stack.clear()
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and self.undo_stack:
+            self.nbytes -= self.undo_stack.popleft().nbytes
@@ -0,0 +1,159 @@
+"""Load generator for server.py: concurrent clients playing random moves.
+
+Every client keeps one connection and one game, mirrors the board from responses and
+clicks a random cell having a same-color neighbour, starting a new game when no moves are left.
+
+Usage:
+    python loadgen.py --port 8765 --clients 1000 --duration 10
+    python loadgen.py --unix /tmp/bubbles.sock --clients 1000 --height 20 --width 30
+"""
+import argparse
+import asyncio
+import random
+import sys
+from time import perf_counter
+
+import numpy as np
+
+import protocol
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class GameClient:
+    """Client of one server connection, mirrors board of its current game"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.session = None
+        self.cells = None
+        self.score = 0
+        self.moves = 0
+        self.over = False
+
+    @classmethod
+    async def connect(cls, host: str = "127.0.0.1", port: int = 8765, path: str = None):
+        if path:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def request(self, frame: bytes, expected: int):
+        self.writer.write(frame)
+        opcode, payload = await protocol.read_frame(self.reader)
+        if opcode == protocol.ERROR:
+            code, message = protocol.parse_error(payload)
+            raise ProtocolError(f"Error {code}: {message}")
+        if opcode != expected:
+            raise ProtocolError(f"Unexpected response {opcode:#x}")
+        return payload
+
+    async def new_game(self, height: int, width: int, colors: int, items_in_line: int = 2, seed: int = None):
+        payload = await self.request(protocol.new_request(height, width, colors, items_in_line, seed), protocol.GAME)
+        self.session, self.cells, self.score, self.moves, self.over = protocol.parse_game(payload)
+
+    async def click(self, y: int, x: int):
+        """Returns count of cleared items"""
+        payload = await self.request(protocol.click_request(self.session, y, x), protocol.DIFF)
+        _, cleared, self.score, self.moves, self.over, changes = protocol.parse_diff(payload)
+        self.cells.ravel()[changes["cell"]] = changes["color"]
+        return cleared
+
+    async def close_game(self):
+        await self.request(protocol.close_request(self.session), protocol.CLOSED)
+        self.session = None
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+    def clickable_cells(self):
+        """Flat indexes of cells having a same-color neighbour"""
+        cells = self.cells
+        same = np.zeros(cells.shape, dtype=bool)
+        h_pairs = (cells[:, 1:] == cells[:, :-1]) & (cells[:, 1:] != 0)
+        v_pairs = (cells[1:, :] == cells[:-1, :]) & (cells[1:, :] != 0)
+        same[:, 1:] |= h_pairs
+        same[:, :-1] |= h_pairs
+        same[1:, :] |= v_pairs
+        same[:-1, :] |= v_pairs
+        return np.flatnonzero(same)
+
+
+async def run_client(args, deadline: float, latencies: list, stats: dict, rng):
+    client = await GameClient.connect(args.host, args.port, args.unix)
+    try:
+        new_game = (args.height, args.width, args.colors, args.items_in_line)
+        await client.new_game(*new_game)
+        while perf_counter() < deadline:
+            clickable = client.clickable_cells()
+            if client.over or not len(clickable):
+                await client.close_game()
+                await client.new_game(*new_game)
+                stats["games"] += 1
+                continue
+            y, x = divmod(int(clickable[rng.randrange(len(clickable))]), client.cells.shape[1])
+            start = perf_counter()
+            await client.click(y, x)
+            latencies.append(perf_counter() - start)
+        await client.close_game()
+    finally:
+        await client.close()
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    latencies = []
+    stats = {"games": 0}
+    start = perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*(run_client(args, deadline, latencies, stats, random.Random(rng.getrandbits(32)))
+                           for _ in range(args.clients)))
+    return latencies, stats, perf_counter() - start
+
+
+def report(latencies, games: int, elapsed: float):
+    if not latencies:
+        return "No requests were made"
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1e3
+    lines = [
+        f"Clicks:         {len(latencies)}",
+        f"Requests/sec:   {len(latencies) / elapsed:.0f}",
+        f"Latency p50/p99/max: {p50:.2f} / {p99:.2f} / {max(latencies) * 1e3:.2f} ms",
+        f"Games finished: {games}",
+    ]
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Play many concurrent games on server.py and report throughput")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="Unix socket path of the server")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=10, help="seconds to run")
+    parser.add_argument("--height", type=int, default=10)
+    parser.add_argument("--width", type=int, default=10)
+    parser.add_argument("--colors", type=int, default=5)
+    parser.add_argument("--items-in-line", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    latencies, stats, elapsed = asyncio.run(run(args))
+    print(f"{args.clients} clients, board {args.height}x{args.width}, {args.colors} colors, {elapsed:.1f} s")
+    print(report(latencies, stats["games"], elapsed))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
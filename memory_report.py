@@ -0,0 +1,99 @@
+"""Memory taken by a GameField per board cell, measured with tracemalloc.
+
+tracemalloc sees Python objects only: GameCell/GameItem objects, containers and NumPy arrays.
+With --resident growth of resident memory of the process is measured instead, without tracing,
+which includes Qt allocations and allocator overhead.
+
+Usage:
+    python memory_report.py --sizes 100x100 1000x1000 --budget 200
+    python memory_report.py --sizes 1000x1000 --resident
+"""
+import argparse
+import gc
+import sys
+import tracemalloc
+
+from PyQt5.QtCore import QCoreApplication
+
+from benchtools import parse_size
+from game_logic import GameField
+
+
+def resident_bytes():
+    """Resident memory of the process, 0 where /proc is not available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * 4096
+    except OSError:
+        return 0
+
+
+def measure(height: int, width: int, colors: int = 5, seed: int = 0):
+    """Returns traced bytes per cell of a new field and of the same field after reset"""
+    app = QCoreApplication.instance() or QCoreApplication([])
+    gc.collect()
+    tracemalloc.start()
+    try:
+        field = GameField(height, width, colors, seed=seed)
+        created, created_peak = tracemalloc.get_traced_memory()
+        field.reset()
+        gc.collect()
+        after_reset, reset_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    cells = height * width
+    return {
+        "height": height,
+        "width": width,
+        "traced_per_cell": created / cells,
+        "peak_per_cell": created_peak / cells,
+        "after_reset_per_cell": after_reset / cells,
+        "reset_peak_per_cell": reset_peak / cells,
+    }
+
+
+def measure_resident(height: int, width: int, colors: int = 5, seed: int = 0):
+    """Returns growth of resident memory per cell after creating a field, None without /proc"""
+    app = QCoreApplication.instance() or QCoreApplication([])
+    gc.collect()
+    before = resident_bytes()
+    field = GameField(height, width, colors, seed=seed)
+    after = resident_bytes()
+    return (after - before) / (height * width) if before else None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Report memory of GameField per board cell")
+    parser.add_argument("--sizes", nargs="+", default=["100x100", "1000x1000"], help="board sizes as HEIGHTxWIDTH")
+    parser.add_argument("--colors", type=int, default=5)
+    parser.add_argument("--budget", type=float, help="fail when bytes per cell exceed it")
+    parser.add_argument("--resident", action="store_true", help="measure resident memory instead of tracing")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    over_budget = False
+    for height, width in map(parse_size, args.sizes):
+        if args.resident:
+            per_cell = measure_resident(height, width, args.colors)
+            if per_cell is None:
+                print("Resident memory is not available on this platform")
+                return 1
+            print(f"{height:>5}x{width:<5}: resident {per_cell:>7.1f} B/cell")
+        else:
+            result = measure(height, width, args.colors)
+            per_cell = result["traced_per_cell"]
+            print(f"{height:>5}x{width:<5}: traced {per_cell:>7.1f} B/cell "
+                  f"(peak {result['peak_per_cell']:.1f}), after reset {result['after_reset_per_cell']:.1f} "
+                  f"(peak {result['reset_peak_per_cell']:.1f})")
+        if args.budget is not None and per_cell > args.budget:
+            over_budget = True
+    if over_budget:
+        print(f"Over budget of {args.budget:.0f} bytes per cell")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
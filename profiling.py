@@ -0,0 +1,65 @@
+import csv
+import json
+from time import perf_counter
+
+
+class MoveProfiler:
+    """Per-move timings and counters of GameField and its widgets.
+
+    A move starts with a click and collects everything that follows until the next click:
+    falling animation frames and repaints are added to the last move.
+    Instrumented code only checks that profiler is not None, so nothing is recorded or paid when it is off.
+    """
+    SECTIONS = ("group_search", "collapse", "view_sync", "signals", "loss_check", "animation", "repaint")
+    COUNTERS = ("signals_emitted", "cells_changed", "cells_repainted", "frames")
+
+    def __init__(self):
+        self.moves = []
+        self._last_mark = 0.0
+
+    def start_move(self, y: int, x: int):
+        move = {"move": len(self.moves), "y": y, "x": x, "total_us": 0.0}
+        move.update({f"{section}_us": 0.0 for section in self.SECTIONS})
+        move.update({counter: 0 for counter in self.COUNTERS})
+        self.moves.append(move)
+        self._start = self._last_mark = perf_counter()
+
+    def mark(self, section: str):
+        """Adds time passed since previous mark to section of current move"""
+        now = perf_counter()
+        self.add(section, now - self._last_mark)
+        self._last_mark = now
+
+    def end_move(self):
+        if self.moves:
+            self.moves[-1]["total_us"] += (perf_counter() - self._start) * 1e6
+
+    def add(self, section: str, seconds: float):
+        if self.moves:
+            self.moves[-1][f"{section}_us"] += seconds * 1e6
+
+    def count(self, counter: str, n: int = 1):
+        if self.moves:
+            self.moves[-1][counter] += n
+
+    def summary(self):
+        """Mean of every timing and counter over recorded moves"""
+        if not self.moves:
+            return {}
+        keys = [key for key in self.moves[0] if key not in ("move", "y", "x")]
+        return {key: sum(move[key] for move in self.moves) / len(self.moves) for key in keys}
+
+    def reset(self):
+        self.moves = []
+
+    def to_json(self, path: str):
+        with open(path, "w") as f:
+            json.dump({"summary": self.summary(), "moves": self.moves}, f, indent=2)
+
+    def to_csv(self, path: str):
+        if not self.moves:
+            return
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(self.moves[0]))
+            writer.writeheader()
+            writer.writerows(self.moves)
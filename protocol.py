@@ -0,0 +1,105 @@
+"""Binary protocol of the game server.
+
+Every message is a frame: u32 payload length, u8 opcode and payload, integers are little-endian.
+
+Requests:
+    NEW     u16 height, u16 width, u8 colors, u8 items in line, u8 has seed, u64 seed
+    CLICK   u32 session, u16 y, u16 x
+    BOARD   u32 session
+    CLOSE   u32 session
+Responses:
+    GAME    u32 session, u16 height, u16 width, u64 score, u32 moves, u8 over, height * width cells (int8)
+    DIFF    u32 session, u32 cleared, u64 score, u32 moves, u8 over, u32 count, count * (u32 cell index, u8 color)
+    CLOSED  u32 session
+    ERROR   u8 code, utf-8 message
+"""
+import struct
+
+import numpy as np
+
+NEW = 0x01
+CLICK = 0x02
+BOARD = 0x03
+CLOSE = 0x04
+GAME = 0x81
+DIFF = 0x82
+CLOSED = 0x84
+ERROR = 0xFF
+
+ERROR_BAD_REQUEST = 1
+ERROR_NO_SESSION = 2
+ERROR_TOO_MANY_SESSIONS = 3
+
+HEADER = struct.Struct("<IB")
+NEW_REQUEST = struct.Struct("<HHBBBQ")
+CLICK_REQUEST = struct.Struct("<IHH")
+SESSION = struct.Struct("<I")
+GAME_HEADER = struct.Struct("<IHHQIB")
+DIFF_HEADER = struct.Struct("<IIQIBI")
+ERROR_HEADER = struct.Struct("<B")
+CHANGE = np.dtype([("cell", "<u4"), ("color", "i1")])
+
+MAX_FRAME = 16 * 1024 * 1024
+
+
+def frame(opcode: int, payload: bytes = b""):
+    return HEADER.pack(len(payload), opcode) + payload
+
+
+async def read_frame(reader):
+    """Returns (opcode, payload), raises asyncio.IncompleteReadError when the stream ends"""
+    length, opcode = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if length > MAX_FRAME:
+        raise ValueError(f"Frame of {length} bytes is too big")
+    return opcode, await reader.readexactly(length)
+
+
+def new_request(height: int, width: int, colors: int, items_in_line: int = 2, seed: int = None):
+    return frame(NEW, NEW_REQUEST.pack(height, width, colors, items_in_line, seed is not None, seed or 0))
+
+
+def click_request(session: int, y: int, x: int):
+    return frame(CLICK, CLICK_REQUEST.pack(session, y, x))
+
+
+def board_request(session: int):
+    return frame(BOARD, SESSION.pack(session))
+
+
+def close_request(session: int):
+    return frame(CLOSE, SESSION.pack(session))
+
+
+def game_response(session: int, cells, score: int, moves: int, over: bool):
+    height, width = cells.shape
+    return frame(GAME, GAME_HEADER.pack(session, height, width, score, moves, over) + cells.tobytes())
+
+
+def parse_game(payload):
+    """Returns (session, cells, score, moves, over)"""
+    session, height, width, score, moves, over = GAME_HEADER.unpack_from(payload)
+    cells = np.frombuffer(payload, dtype=np.int8, count=height * width, offset=GAME_HEADER.size)
+    return session, cells.reshape(height, width).copy(), score, moves, bool(over)
+
+
+def diff_response(session: int, cleared: int, score: int, moves: int, over: bool, cells, colors):
+    changes = np.empty(len(cells), dtype=CHANGE)
+    changes["cell"] = cells
+    changes["color"] = colors
+    return frame(DIFF, DIFF_HEADER.pack(session, cleared, score, moves, over, len(changes)) + changes.tobytes())
+
+
+def parse_diff(payload):
+    """Returns (session, cleared, score, moves, over, changes) with changes as array of CHANGE records"""
+    session, cleared, score, moves, over, count = DIFF_HEADER.unpack_from(payload)
+    changes = np.frombuffer(payload, dtype=CHANGE, count=count, offset=DIFF_HEADER.size)
+    return session, cleared, score, moves, bool(over), changes
+
+
+def error_response(code: int, message: str):
+    return frame(ERROR, ERROR_HEADER.pack(code) + message.encode())
+
+
+def parse_error(payload):
+    """Returns (code, message)"""
+    return payload[0], bytes(payload[ERROR_HEADER.size:]).decode()
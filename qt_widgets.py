@@ -1,5 +1,6 @@
-from itertools import chain
+from time import perf_counter
 
+import numpy as np
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 from PyQt5.QtWidgets import *
@@ -29,35 +30,19 @@ class QLabelNumber(QLabel):
         self.setText(str(number))
 
 
-class FieldItemWidget(QPushButton):
-    changed = pyqtSignal(QObject)
-    leftButtonPressed = pyqtSignal(QObject)
-    rightButtonPressed = pyqtSignal(QObject)
+class BallSprites:
+    """Shared cache of pre-rendered balls keyed by color, size and device pixel ratio"""
+    MAX_SPRITES = 256
 
-    def __init__(self, y, x, *args, **kwargs):
-        super(FieldItemWidget, self).__init__(*args, **kwargs)
-        self._y = y
-        self._x = x
-        size_policy = QSizePolicy.Expanding
-        policy = QSizePolicy()
-        policy.setHorizontalPolicy(size_policy)
-        policy.setVerticalPolicy(size_policy)
-        policy.setWidthForHeight(True)
-        self.setSizePolicy(policy)
+    def __init__(self):
+        self._sprites = {}
+        self.shadow_color = QColor("#000000")
+        self.shadow_color.setAlpha(100)
 
-        self.logic_source = self.parent().logic_source.items[y, x]
-        self.logic_source.changed.connect(self.changed)
-
-        self.gradient = None
-        self.construct_gradient(QColor(self.logic_source.item.color))
-
-        self.active_size_toggled = False
-        self.self_size_modifier = 1
-        self.update()
-
-    def construct_gradient(self, color: QColor = QColor("magenta")):
+    @staticmethod
+    def construct_gradient(color: QColor = QColor("magenta")):
         gr = QRadialGradient()
-        gr.setCoordinateMode(QGradient.StretchToDeviceMode)
+        gr.setCoordinateMode(QGradient.ObjectBoundingMode)
         c1 = color.lighter(150)
         c2 = color.darker(450)
 
@@ -67,92 +52,195 @@ class FieldItemWidget(QPushButton):
         gr.setCenter(QPointF(0.7, 0.3))
 
         gr.setFocalPoint(QPointF(0.7, 0.3))
-        self.gradient = gr
-
-    def changed(self):
-        if self.logic_source.item:
-            self.construct_gradient(QColor(self.logic_source.item.color))
-        self.update()
+        return gr
 
-    def resizeEvent(self, e: QResizeEvent):
-        super().resizeEvent(e)
-        self.pct = Percent(self.rect().width())
+    def render(self, color: str, size: int, ratio: float):
+        pixmap = QPixmap(round(size * ratio), round(size * ratio))
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(Qt.transparent)
 
-    def paintEvent(self, e: QPaintEvent):
-        # super().paintEvent(e)
-        painter = QPainter(self)
+        painter = QPainter(pixmap)
         painter.setRenderHints(QPainter.Antialiasing | QPainter.SmoothPixmapTransform)
         painter.setPen(Qt.NoPen)
 
-        pct = self.pct
-        if self.logic_source.item is not None:
-            rect = QRectF(self.rect()).marginsAdded(QMarginsF() - (pct(2)))
-            shadow_rect = QRectF(rect)
-            shadow_rect.translate(QPoint(pct(-1), pct(1)))
-            shadow_rect.adjust(pct(-2), pct(2), pct(0), pct(2))
-
-            shadow_color = QColor("#000000")
-            shadow_color.setAlpha(100)
-
-            painter.setBrush(shadow_color)
-            painter.drawEllipse(shadow_rect)
+        pct = Percent(size)
+        rect = QRectF(0, 0, size, size).marginsAdded(QMarginsF() - (pct(2)))
+        shadow_rect = QRectF(rect)
+        shadow_rect.translate(QPointF(pct(-1), pct(1)))
+        shadow_rect.adjust(pct(-2), pct(2), pct(0), pct(2))
 
-            painter.setBrush(self.gradient)
-            painter.drawEllipse(rect)
+        painter.setBrush(self.shadow_color)
+        painter.drawEllipse(shadow_rect)
 
+        painter.setBrush(self.construct_gradient(QColor(color)))
+        painter.drawEllipse(rect)
         painter.end()
+        return pixmap
 
-    def sizeHint(self):
-        return QSize(50, 50)
+    def sprite(self, color: str, size: int, ratio: float):
+        key = (color, size, ratio)
+        pixmap = self._sprites.get(key)
+        if pixmap is None:
+            if len(self._sprites) >= self.MAX_SPRITES:
+                self._sprites.pop(next(iter(self._sprites)))
+            pixmap = self._sprites[key] = self.render(color, size, ratio)
+        return pixmap
 
-    def minimumSizeHint(self):
-        return QSize(self.sizeHint().width() // 2, self.sizeHint().height() // 2)
-
-    def __repr__(self):
-        return f"FieldItemWidget({self._y}, {self._x})"
-
-    def mousePressEvent(self, e: QMouseEvent):
-        if e.button() == Qt.LeftButton:
-            self.leftButtonPressed.emit(self)
-        elif e.button() == Qt.RightButton:
-            self.rightButtonPressed.emit(self)
-        else:
-            pass
+    def evict(self, keep_size: int = None):
+        """Drops sprites of all sizes except keep_size"""
+        self._sprites = {key: pixmap for key, pixmap in self._sprites.items() if key[1] == keep_size}
 
 
 class GameFieldWidget(QWidget):
+    """Draws the board in one widget straight from the engine cells.
+
+    Group under the mouse cursor is highlighted and its score is sent with hover_changed,
+    the group comes from the field's group index, on big boards only the hovered group is searched,
+    so mouse moves inside a group do no search.
+    Wheel zooms around the cursor, dragging with middle button pans. Only cells inside
+    the viewport are painted and changes outside of it are not redrawn; cells smaller
+    than MIN_SPRITE_SIZE are drawn as one image sampled to about one pixel per cell.
+    """
+    MARGIN = 10
+    MIN_SPRITE_SIZE = 4
+    MAX_CELL_SIZE = 100
+    ZOOM_STEP = 1.25
+    # Above this many changed visible cells their bounding rect is updated at once
+    MAX_DIRTY_RECTS = 64
+    ball_sprites = BallSprites()
+    # Size and score of the group under the cursor, zeros when there is none
+    hover_changed = pyqtSignal(int, int)
+
     def __init__(self, logic_source, *args, **kwargs):
         super(GameFieldWidget, self).__init__(*args, **kwargs)
 
         self.logic_source = logic_source
 
-        self.logic_source.items_were_spawned.connect(self.parent().sounds.tick2.play)
-        bubble_sounds = self.parent().sounds
-        self.logic_source.cells_cleared.connect(bubble_sounds.bubbles_play)
+        sounds = self.parent().sounds
+        self.logic_source.items_were_spawned.connect(sounds.tick2_play)
+        self.logic_source.cells_cleared.connect(sounds.bubbles_play)
+        self.logic_source.board_changed.connect(self.cells_changed)
+        self.logic_source.board_replaced.connect(self.board_replaced)
+        self.logic_source.groups_changed.connect(self.groups_changed)
 
-        layout = QGridLayout()
-        self.setLayout(layout)
-        layout.setSpacing(0)
-        layout.heightForWidth(True)
-        self.fieldItems2D = []
-        height, width = logic_source.items._container.shape
-
-        for y in range(height):
-            self.fieldItems2D.append([])
-            for x in range(width):
-                item = FieldItemWidget(y, x, parent=self)
-                self.fieldItems2D[y].append(item)
-                layout.addWidget(item, y, x)
-                item.leftButtonPressed.connect(self.item_clicked)
-                item.rightButtonPressed.connect(self.item_clicked)
-
-        self.fieldItems = list(chain.from_iterable(self.fieldItems2D))
+        size_policy = QSizePolicy.Expanding
+        policy = QSizePolicy()
+        policy.setHorizontalPolicy(size_policy)
+        policy.setVerticalPolicy(size_policy)
+        self.setSizePolicy(policy)
+
+        self.sprites = self.ball_sprites
+        self.hint_cells = []
 
+        self.setMouseTracking(True)
+        self.hover_cell = None
+        self.hover_label = None
+        self.hover_members = np.zeros(0, dtype=np.intp)
+        self.hover_refresh_pending = False
+
+        height, width = logic_source.engine.cells.shape
         self.ratio = width / height
         self.adjusted_to_size = (-1, -1)
-        # self.setSizePolicy(QSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored))
+
+        # Zoom 1 fits the whole board, offset is position of viewport in the zoomed board
+        self.zoom = 1.0
+        self.offset = QPointF()
+        self.pan_start = None
+
+    def viewport_rect(self):
+        """Part of the widget the board is shown in"""
+        return QRectF(self.contentsRect()).marginsRemoved(QMarginsF() + self.MARGIN)
+
+    def board_rect(self):
+        """Rect of the whole zoomed board in widget coordinates, may exceed the viewport"""
+        view = self.viewport_rect()
+        return QRectF(view.left() - self.offset.x(), view.top() - self.offset.y(),
+                      view.width() * self.zoom, view.height() * self.zoom)
+
+    def max_zoom(self):
+        height, width = self.logic_source.engine.cells.shape
+        view = self.viewport_rect()
+        fit_cell = min(view.width() / width, view.height() / height)
+        return max(1.0, self.MAX_CELL_SIZE / fit_cell) if fit_cell > 0 else 1.0
+
+    def set_zoom(self, zoom: float, anchor: QPointF = None):
+        """Zooms keeping the board point under anchor, viewport center by default, in place"""
+        view = self.viewport_rect()
+        if anchor is None:
+            anchor = view.center()
+        board = self.board_rect()
+        if board.width() <= 0 or board.height() <= 0:
+            return
+        u = (anchor.x() - board.left()) / board.width()
+        v = (anchor.y() - board.top()) / board.height()
+        self.zoom = min(max(zoom, 1.0), self.max_zoom())
+        self.offset = QPointF(view.left() + u * view.width() * self.zoom - anchor.x(),
+                              view.top() + v * view.height() * self.zoom - anchor.y())
+        self.clamp_offset()
+        self.sprites.evict(keep_size=self.sprite_size())
+        self.update()
+
+    def pan(self, dx: float, dy: float):
+        self.offset += QPointF(dx, dy)
+        self.clamp_offset()
+        self.update()
+
+    def clamp_offset(self):
+        view = self.viewport_rect()
+        max_x = view.width() * (self.zoom - 1)
+        max_y = view.height() * (self.zoom - 1)
+        self.offset = QPointF(min(max(self.offset.x(), 0.0), max_x), min(max(self.offset.y(), 0.0), max_y))
+
+    def reset_view(self):
+        self.zoom = 1.0
+        self.offset = QPointF()
+        self.update()
+
+    def cell_size(self):
+        height, width = self.logic_source.engine.cells.shape
+        board = self.board_rect()
+        return board.width() / width, board.height() / height
+
+    def cell_rect(self, y: int, x: int):
+        board = self.board_rect()
+        cell_width, cell_height = self.cell_size()
+        return QRectF(board.left() + x * cell_width, board.top() + y * cell_height, cell_width, cell_height)
+
+    def cell_at(self, pos: QPoint):
+        """Returns (y, x) of cell under widget position or None"""
+        height, width = self.logic_source.engine.cells.shape
+        board = self.board_rect()
+        cell_width, cell_height = self.cell_size()
+        if cell_width <= 0 or cell_height <= 0 or not self.viewport_rect().contains(QPointF(pos)):
+            return None
+        x = int((pos.x() - board.left()) // cell_width)
+        y = int((pos.y() - board.top()) // cell_height)
+        if 0 <= y < height and 0 <= x < width:
+            return y, x
+        return None
+
+    def cells_in_rect(self, rect: QRect):
+        """Returns ranges of rows and columns intersecting with visible part of rect"""
+        height, width = self.logic_source.engine.cells.shape
+        board = self.board_rect()
+        cell_width, cell_height = self.cell_size()
+        rect = QRectF(rect).intersected(self.viewport_rect())
+        if cell_width <= 0 or cell_height <= 0 or rect.isEmpty():
+            return range(0), range(0)
+        x0 = max(int((rect.left() - board.left()) // cell_width), 0)
+        x1 = min(int((rect.right() - board.left()) // cell_width) + 1, width)
+        y0 = max(int((rect.top() - board.top()) // cell_height), 0)
+        y1 = min(int((rect.bottom() - board.top()) // cell_height) + 1, height)
+        return range(y0, y1), range(x0, x1)
+
+    def sprite_size(self):
+        return max(int(min(self.cell_size())), 1)
 
     def paintEvent(self, e: QPaintEvent):
+        profiler = self.logic_source.profiler
+        if profiler is not None:
+            start = perf_counter()
+
         painter = QPainter(self)
         # color = QColor("peachpuff")
         # color.setAlpha(60)
@@ -164,6 +252,71 @@ class GameFieldWidget(QWidget):
         painter.drawRoundedRect(self.rect() + (QMargins() - 1), 20, 20)
         # painter.fillRect(self.rect(), brush)
 
+        board = self.logic_source.engine.cells
+        rows, columns = self.cells_in_rect(e.rect())
+        board_rect = self.board_rect()
+        cell_width, cell_height = self.cell_size()
+        visible = board[rows.start:rows.stop, columns.start:columns.stop]
+        painter.setClipRect(self.viewport_rect())
+        if min(cell_width, cell_height) < self.MIN_SPRITE_SIZE:
+            painted = self.paint_image(painter, visible, QRectF(
+                board_rect.left() + columns.start * cell_width, board_rect.top() + rows.start * cell_height,
+                len(columns) * cell_width, len(rows) * cell_height))
+        else:
+            size = self.sprite_size()
+            ratio = self.devicePixelRatioF()
+            sprites = [self.sprites.sprite(color, size, ratio) for color in self.logic_source.field_colors]
+            ys, xs = np.nonzero(visible)
+            for y, x, color_index in zip(ys.tolist(), xs.tolist(), visible[ys, xs].tolist()):
+                left = board_rect.left() + (x + columns.start) * cell_width
+                top = board_rect.top() + (y + rows.start) * cell_height
+                painter.drawPixmap(QPointF(left, top), sprites[color_index - 1])
+            painted = len(ys)
+
+        if len(self.hover_members):
+            self.paint_hover(painter, rows, columns)
+
+        if self.hint_cells:
+            painter.setRenderHints(QPainter.Antialiasing)
+            painter.setBrush(Qt.NoBrush)
+            painter.setPen(QPen(QColor("white"), 2))
+            for y, x in self.hint_cells:
+                rect = self.cell_rect(y, x)
+                painter.drawEllipse(rect.marginsRemoved(QMarginsF() + rect.width() * 0.04))
+        painter.end()
+
+        if profiler is not None:
+            profiler.add("repaint", perf_counter() - start)
+            profiler.count("cells_repainted", painted)
+
+    def paint_hover(self, painter: QPainter, rows: range, columns: range):
+        ys, xs = np.divmod(self.hover_members, self.logic_source.WIDTH)
+        shown = (ys >= rows.start) & (ys < rows.stop) & (xs >= columns.start) & (xs < columns.stop)
+        color = QColor("white")
+        color.setAlpha(90)
+        painter.setRenderHints(QPainter.Antialiasing)
+        painter.setBrush(color)
+        painter.setPen(Qt.NoPen)
+        for y, x in zip(ys[shown].tolist(), xs[shown].tolist()):
+            rect = self.cell_rect(y, x)
+            painter.drawEllipse(rect.marginsRemoved(QMarginsF() + rect.width() * 0.08))
+
+    def paint_image(self, painter: QPainter, visible, target: QRectF):
+        """Draws cells as flat colored pixels, sampling every n-th cell when cells are smaller than a pixel.
+        Returns number of painted cells"""
+        if not visible.size:
+            return 0
+        ratio = self.devicePixelRatioF()
+        step_y = max(int(visible.shape[0] / max(target.height() * ratio, 1)), 1)
+        step_x = max(int(visible.shape[1] / max(target.width() * ratio, 1)), 1)
+        block = visible[::step_y, ::step_x]
+        palette = np.array([0] + [QColor(color).rgba() for color in self.logic_source.field_colors],
+                           dtype=np.uint32)
+        pixels = np.ascontiguousarray(palette[block])
+        image = QImage(pixels.data, block.shape[1], block.shape[0], block.shape[1] * 4, QImage.Format_ARGB32)
+        painter.drawImage(target, image)
+        return block.size
+
     def resizeEvent(self, event):
         # https://stackoverflow.com/a/61589941/13537384
         size = event.size()
@@ -182,9 +335,119 @@ class GameFieldWidget(QWidget):
         v_margin = round((full_height - height) / 2)
 
         self.setContentsMargins(h_margin, v_margin, h_margin, v_margin)
+        self.clamp_offset()
+        self.sprites.evict(keep_size=self.sprite_size())
+
+    def sizeHint(self):
+        height, width = self.logic_source.engine.cells.shape
+        cell_size = min(50, max(1000 // max(height, width), 2))
+        return QSize(cell_size * width + 2 * self.MARGIN, cell_size * height + 2 * self.MARGIN)
+
+    def minimumSizeHint(self):
+        return QSize(self.sizeHint().width() // 2, self.sizeHint().height() // 2)
+
+    def cells_changed(self, dirty_cells):
+        if self.hint_cells:
+            self.show_hint([])
+        if not dirty_cells:
+            return
+        if self.zoom > 1:
+            dirty = np.array(dirty_cells, dtype=np.intp).reshape(-1, 2)
+            self.update_cells(dirty[:, 0], dirty[:, 1])
+        else:
+            self.update_cell_list(dirty_cells)
+
+    def board_replaced(self):
+        if self.hint_cells:
+            self.hint_cells = []
+        self.update()
 
-    def item_clicked(self, item):
-        self.logic_source.cell_clicked(item.logic_source)
+    def update_cells(self, ys, xs):
+        """Schedules repaint of visible cells given by arrays of rows and columns"""
+        rows, columns = self.cells_in_rect(self.rect())
+        shown = (ys >= rows.start) & (ys < rows.stop) & (xs >= columns.start) & (xs < columns.stop)
+        self.update_cell_list(list(zip(ys[shown].tolist(), xs[shown].tolist())))
+
+    def update_cell_list(self, cells):
+        if len(cells) > self.MAX_DIRTY_RECTS:
+            ys, xs = zip(*cells)
+            rect = self.cell_rect(min(ys), min(xs)).united(self.cell_rect(max(ys), max(xs)))
+            self.update(rect.intersected(self.viewport_rect()).toAlignedRect())
+            return
+        for y, x in cells:
+            self.update(self.cell_rect(y, x).toAlignedRect())
+
+    def set_hover(self, cell):
+        """Highlights group of the cell, None clears the highlight"""
+        self.hover_cell = cell
+        label, size, members = None, 0, self.hover_members[:0]
+        if cell is not None and self.logic_source.engine.cells[cell] != self.logic_source.engine.EMPTY:
+            label, size, members = self.logic_source.group_at(*cell)
+            if size < self.logic_source.ITEMS_IN_LINE:
+                label, size, members = None, 0, self.hover_members[:0]
+        if label == self.hover_label and len(members) == len(self.hover_members):
+            return
+        self.update_cells(*np.divmod(self.hover_members, self.logic_source.WIDTH))
+        self.hover_label = label
+        self.hover_members = members
+        self.update_cells(*np.divmod(members, self.logic_source.WIDTH))
+        self.hover_changed.emit(size, size * size)
+
+    def groups_changed(self):
+        """Group index is rebuilt once for all events of one move, on the next event loop iteration"""
+        if self.hover_cell is not None and not self.hover_refresh_pending:
+            self.hover_refresh_pending = True
+            QTimer.singleShot(0, self.refresh_hover)
+
+    def refresh_hover(self):
+        self.hover_refresh_pending = False
+        # Labels of the new index do not match old ones, so the group is looked up again
+        self.hover_label = None
+        self.set_hover(self.hover_cell)
+
+    def leaveEvent(self, e: QEvent):
+        self.set_hover(None)
+
+    def show_hint(self, cells):
+        """Outlines given cells until the board changes"""
+        for y, x in self.hint_cells + cells:
+            self.update(self.cell_rect(y, x).toAlignedRect())
+        self.hint_cells = cells
+
+    def wheelEvent(self, e: QWheelEvent):
+        steps = e.angleDelta().y() / 120
+        if steps:
+            self.set_zoom(self.zoom * self.ZOOM_STEP ** steps, e.position())
+
+    def mouseMoveEvent(self, e: QMouseEvent):
+        if self.pan_start is not None:
+            delta = self.pan_start - e.localPos()
+            self.pan_start = e.localPos()
+            self.pan(delta.x(), delta.y())
+            return
+        cell = self.cell_at(e.pos())
+        if cell != self.hover_cell:
+            self.set_hover(cell)
+
+    def mouseReleaseEvent(self, e: QMouseEvent):
+        if e.button() == Qt.MiddleButton:
+            self.pan_start = None
+
+    def mouseDoubleClickEvent(self, e: QMouseEvent):
+        if e.button() == Qt.MiddleButton:
+            self.reset_view()
+        else:
+            super(GameFieldWidget, self).mouseDoubleClickEvent(e)
+
+    def mousePressEvent(self, e: QMouseEvent):
+        if e.button() == Qt.MiddleButton:
+            self.pan_start = e.localPos()
+            return
+        if e.button() not in (Qt.LeftButton, Qt.RightButton):
+            return
+        cell = self.cell_at(e.pos())
+        if cell is not None:
+            self.logic_source.cell_clicked(self.logic_source.items[cell])
 
 
 class InformationBar(QWidget):
@@ -204,6 +467,10 @@ class InformationBar(QWidget):
         layout.addWidget(label)
         self.scores_counter = QLabelNumber(self)
         layout.addWidget(self.scores_counter, alignment=Qt.AlignLeft)
+        self.preview = QLabel("")
+        self.preview.setFont(font)
+        self.preview.setMinimumWidth(80)
+        layout.addWidget(self.preview, alignment=Qt.AlignLeft)
 
     def reset(self):
         self.scores_counter.display(0)
@@ -211,6 +478,10 @@ class InformationBar(QWidget):
     def update_counter(self, value):
         self.scores_counter.display(value)
 
+    def show_preview(self, size: int, score: int):
+        """Shows score of the group under the cursor"""
+        self.preview.setText(f"+{score}" if size else "")
+
     def paintEvent(self, e: QPaintEvent):
         painter = QPainter(self)
         color = QColor("white")
@@ -230,11 +501,30 @@ class GameActions(QObject):
         self.spawnAction = QAction("Spawn", self)
         self.spawnAction.triggered.connect(self.parent().logic_source.spawn_items)
 
+        self.undoAction = QAction("Undo", self)
+        self.undoAction.setShortcut(QKeySequence.Undo)
+        self.undoAction.triggered.connect(self.parent().logic_source.undo)
+
+        self.redoAction = QAction("Redo", self)
+        self.redoAction.setShortcut(QKeySequence.Redo)
+        self.redoAction.triggered.connect(self.parent().logic_source.redo)
+
+        self.parent().logic_source.history_changed.connect(self.update_history_actions)
+        self.update_history_actions()
+
+        self.hintAction = QAction("Hint", self)
+        self.hintAction.triggered.connect(self.parent().show_hint)
+
         self.toggleSound = QAction("Sound", self)
         self.toggleSound.triggered.connect(self.parent().sounds.toggle_sound)
         self.toggleSound.setCheckable(True)
         self.toggleSound.setChecked(True)
 
+    def update_history_actions(self):
+        history = self.parent().logic_source.history
+        self.undoAction.setEnabled(history.can_undo())
+        self.redoAction.setEnabled(history.can_redo())
+
 
 class GameMenu(QMenuBar):
     def __init__(self, *args, **kwargs):
@@ -243,17 +533,29 @@ class GameMenu(QMenuBar):
         file_menu = self.addMenu("File")
         file_menu.addAction(self.parent().game_actions.resetAction)
         file_menu.addAction(self.parent().game_actions.spawnAction)
+        file_menu.addAction(self.parent().game_actions.undoAction)
+        file_menu.addAction(self.parent().game_actions.redoAction)
+        file_menu.addAction(self.parent().game_actions.hintAction)
         file_menu.addAction(self.parent().game_actions.toggleSound)
 
 
 class MainWindow(QMainWindow):
     current_scores = pyqtSignal(int)
+    # Emitted once, after the window and all its widgets are painted for the first time
+    first_frame_shown = pyqtSignal()
+    HINT_BUDGET_MS = 200
+    SCORES_PATH = "scores.db"
 
     def __init__(self, *args, **kwargs):
         super(MainWindow, self).__init__(*args, **kwargs)
         self.setWindowTitle("Bubble trouble")
         self.setWindowIcon(QIcon("FILE.ico"))
         self.sounds = Sounds()
+        self.first_frame = False
+        self.first_frame_shown.connect(self.sounds.load)
+        # Opened after the first frame, like sounds, as sqlite3 is not needed to show the window
+        self.score_store = None
+        self.first_frame_shown.connect(self.open_score_store)
         # self.menuBar().show()
 
         self.logic_source = GameField(height=10, width=10, colors=5)
@@ -267,7 +569,9 @@ class MainWindow(QMainWindow):
         self.status_bar = InformationBar(logic_source=self.logic_source, parent=self)
         layout.addWidget(self.status_bar)
 
-        layout.addWidget(GameFieldWidget(logic_source=self.logic_source, parent=self))
+        self.field_widget = GameFieldWidget(logic_source=self.logic_source, parent=self)
+        layout.addWidget(self.field_widget)
+        self.field_widget.hover_changed.connect(self.status_bar.show_preview)
 
         self.scores = 0
 
@@ -278,6 +582,8 @@ class MainWindow(QMainWindow):
 
         self.logic_source.cells_cleared.connect(self.add_scores)
         self.logic_source.field_was_reset.connect(self.reset_scores)
+        self.logic_source.score_changed.connect(self.set_scores)
+        self.logic_source.game_finished.connect(self.record_game)
 
         size_policy = QSizePolicy.Minimum
         policy = QSizePolicy()
@@ -290,13 +596,45 @@ class MainWindow(QMainWindow):
     def reset_scores(self):
         self.scores = 0
         self.current_scores.emit(self.scores)
-        self.sounds.restart.play()
+        self.sounds.restart_play()
+
+    def set_scores(self, scores):
+        self.scores = scores
+        self.current_scores.emit(self.scores)
 
     def add_scores(self, cells_cleared):
         self.scores += cells_cleared * cells_cleared
         self.current_scores.emit(self.scores)
 
+    def open_score_store(self):
+        if self.score_store is None:
+            from score_store import ScoreStore
+            self.score_store = ScoreStore(self.SCORES_PATH)
+
+    def record_game(self, game: dict):
+        """Queues a finished game for the score database, it is written in background"""
+        self.open_score_store()
+        self.score_store.add_game(**game)
+
+    def closeEvent(self, e: QCloseEvent):
+        if self.score_store is not None:
+            self.score_store.close()
+        super(MainWindow, self).closeEvent(e)
+
+    def show_hint(self):
+        # Solver is loaded on first hint, it is not needed to show the window
+        from solver import suggest_move
+        # Hint is searched on the landed board, the one the next click is made on
+        self.logic_source.settle()
+        move = suggest_move(self.logic_source, self.HINT_BUDGET_MS)
+        if move is not None:
+            self.field_widget.show_hint(self.logic_source.engine.find_same_items(*move))
+
     def paintEvent(self, e: QPaintEvent):
         painter = QPainter(self)
         brush = QBrush(QColor("cornsilk"))
         painter.fillRect(self.rect(), brush)
+        if not self.first_frame:
+            self.first_frame = True
+            # Child widgets are painted after this, so the signal is sent from the next event loop iteration
+            QTimer.singleShot(0, self.first_frame_shown.emit)
@@ -0,0 +1,111 @@
+"""Compact binary replay log of a game.
+
+Record layout: magic b"BR", format version byte, then unsigned LEB128 varints:
+seed, height, width, colors, items in line, final score, moves, events count and events.
+Event below height * width is a cleared group clicked at flat index y * width + x,
+the next code is spawn of a row followed by number of spawned columns. Falls are not recorded,
+every move is made on a landed board, so a replay lands the board before each event.
+Records are self-delimiting and can be concatenated into one file.
+"""
+
+MAGIC = b"BR"
+VERSION = 1
+
+
+def encode_varint(value: int, out: bytearray):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(data, offset: int):
+    """Returns (value, offset after it)"""
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class ReplayLog:
+    """Seed and board parameters of a game plus every move made on its engine"""
+    SPAWN = 0
+
+    def __init__(self, seed: int, height: int, width: int, colors: int, items_in_line: int = 2):
+        self.seed = seed
+        self.height = height
+        self.width = width
+        self.colors = colors
+        self.items_in_line = items_in_line
+        self.cells_count = height * width
+        self.score = 0
+        self.moves = 0
+        self.events = []
+
+    def clear(self, y: int, x: int, cleared: int):
+        self.events.append(y * self.width + x)
+        self.score += cleared * cleared
+        self.moves += 1
+
+    def spawn(self, n: int):
+        self.events.append(self.cells_count + self.SPAWN)
+        self.events.append(n)
+
+    def to_bytes(self):
+        out = bytearray(MAGIC)
+        out.append(VERSION)
+        for value in (self.seed, self.height, self.width, self.colors, self.items_in_line,
+                      self.score, self.moves, len(self.events)):
+            encode_varint(value, out)
+        for event in self.events:
+            encode_varint(event, out)
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data, offset: int = 0):
+        """Returns (log, offset after its record)"""
+        if data[offset:offset + len(MAGIC)] != MAGIC:
+            raise ValueError(f"No replay record at offset {offset}")
+        offset += len(MAGIC)
+        version = data[offset]
+        if version != VERSION:
+            raise ValueError(f"Unsupported replay version {version}")
+        offset += 1
+
+        values = []
+        for _ in range(8):
+            value, offset = decode_varint(data, offset)
+            values.append(value)
+        seed, height, width, colors, items_in_line, score, moves, events_count = values
+
+        log = cls(seed, height, width, colors, items_in_line)
+        log.score = score
+        log.moves = moves
+        events = log.events
+        for _ in range(events_count):
+            event, offset = decode_varint(data, offset)
+            events.append(event)
+        return log, offset
+
+    def __repr__(self):
+        return (f"ReplayLog(seed={self.seed}, {self.height}x{self.width}, colors={self.colors}, "
+                f"score={self.score}, moves={self.moves})")
+
+
+def write_replays(path: str, logs, append: bool = True):
+    with open(path, "ab" if append else "wb") as f:
+        for log in logs:
+            f.write(log.to_bytes())
+
+
+def read_replays(path: str):
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset < len(data):
+        log, offset = ReplayLog.from_bytes(data, offset)
+        yield log
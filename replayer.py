@@ -0,0 +1,81 @@
+"""Headless replay of recorded games, checks that every replay reaches its recorded score.
+
+Usage: python replayer.py games.bin
+"""
+import argparse
+import sys
+from time import perf_counter
+
+from board_engine import BoardEngine
+from replay import ReplayLog, read_replays
+
+
+def replay(log: ReplayLog):
+    """Plays the log on a fresh engine, returns (score, engine in final state)"""
+    engine = BoardEngine(log.height, log.width, log.colors, log.items_in_line, seed=log.seed)
+    engine.fill()
+    cells_count = log.cells_count
+    spawn = cells_count + ReplayLog.SPAWN
+    all_columns = range(log.width)
+    score = 0
+    # Spawned items fall, moves were made after they landed
+    falling = False
+    events = iter(log.events)
+    for event in events:
+        if falling:
+            engine.drop_items(all_columns)
+            falling = False
+        if event < cells_count:
+            y, x = divmod(event, log.width)
+            same_items = engine.find_same_items(y, x)
+            if len(same_items) < log.items_in_line:
+                raise ValueError(f"Replay clicks cell ({y}, {x}) which can not be cleared")
+            engine.clear_items(same_items)
+            score += len(same_items) * len(same_items)
+        elif event == spawn:
+            falling = bool(engine.spawn_row(next(events)))
+        else:
+            raise ValueError(f"Unknown replay event {event}")
+    if falling:
+        engine.drop_items(all_columns)
+    return score, engine
+
+
+def check_replays(logs):
+    """Replays every log, returns (replays checked, list of (index, log, replayed score) which differ)"""
+    checked = 0
+    mismatches = []
+    for index, log in enumerate(logs):
+        try:
+            score, _ = replay(log)
+        except ValueError:
+            score = None
+        if score != log.score:
+            mismatches.append((index, log, score))
+        checked += 1
+    return checked, mismatches
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded games and check their final scores")
+    parser.add_argument("files", nargs="+", help="files with replay logs")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    failed = 0
+    for path in args.files:
+        start = perf_counter()
+        checked, mismatches = check_replays(read_replays(path))
+        elapsed = perf_counter() - start
+        for index, log, score in mismatches:
+            print(f"{path} #{index}: {log} replayed to {'invalid move' if score is None else score}")
+        print(f"{path}: {checked} replays, {len(mismatches)} mismatches, "
+              f"{checked / elapsed if elapsed else 0:.1f} replays per sec")
+        failed += len(mismatches)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
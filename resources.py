@@ -1,54 +1,126 @@
+import os
+from functools import partial
 from random import choice
+from statistics import median
+from time import perf_counter
 
-from PyQt5.QtCore import QObject
-from PyQt5.QtMultimedia import QSound
+from PyQt5.QtCore import QObject, QTimer, QUrl
 
 
 class Sounds(QObject):
+    """Game sound effects.
+
+    Nothing is loaded on creation: load() imports QtMultimedia and reads WAV files one per
+    event loop iteration, MainWindow calls it after the first frame is shown.
+    Effects which are not loaded yet are skipped, without QtMultimedia the game is silent.
+
+    Every effect is decoded once into memory and played by a pool of VOICES QSoundEffect voices,
+    so quick repeats overlap instead of cutting each other off. When all voices of an effect
+    are busy, the one which started first is stopped and reused.
+    """
+    VOICES = 3
+    FILES = {
+        "tick": "./wav//tick.wav",
+        "tick2": "./wav//tick2.wav",
+        "line_cleared": "./wav//line_cleared.wav",
+        "restart": "./wav//restart.wav",
+        "bubbles_01": "./wav//bubbles_01.wav",
+        # "bubbles_02": "./wav//bubbles_02.wav",
+        "bubbles_03": "./wav//bubbles_03.wav",
+        # "bubbles_04": "./wav//bubbles_04.wav", # ?
+        "bubbles_05": "./wav//bubbles_05.wav",
+        # "bubbles_06": "./wav//bubbles_06.wav",
+        "bubbles_07": "./wav//bubbles_07.wav",
+        # "bubbles_08": "./wav//bubbles_08.wav",
+        "bubbles_09": "./wav//bubbles_09.wav",
+    }
+    BUBBLES = ["bubbles_01", "bubbles_03", "bubbles_05", "bubbles_07", "bubbles_09"]
+
     def __init__(self, audio_on=True, *args, **kwargs):
         super(Sounds, self).__init__(*args, **kwargs)
         self.audio_on = audio_on
-        self.tick = GameSound("./wav//tick.wav", self)
-        self.tick2 = GameSound("./wav//tick2.wav", self)
-        self.line_cleared = GameSound("./wav//line_cleared.wav", self)
-        self.restart = GameSound("./wav//restart.wav", self)
-
-        self.bubbles_01 = GameSound("./wav//bubbles_01.wav", self)
-        # self.bubbles_02 = GameSound("./wav//bubbles_02.wav", self)
-        self.bubbles_03 = GameSound("./wav//bubbles_03.wav", self)
-        # self.bubbles_04 = GameSound("./wav//bubbles_04.wav", self) # ?
-        self.bubbles_05 = GameSound("./wav//bubbles_05.wav", self)
-        # self.bubbles_06 = GameSound("./wav//bubbles_06.wav", self)
-        self.bubbles_07 = GameSound("./wav//bubbles_07.wav", self)
-        # self.bubbles_08 = GameSound("./wav//bubbles_08.wav", self)
-        self.bubbles_09 = GameSound("./wav//bubbles_09.wav", self)
+        self.effects = {}
+        self._pending = []
+        self._plays = 0
+        self._started = {}
+        self._requested = {}
+        # Seconds from play request to playback start, None when not measured
+        self.latencies = None
 
-    def bubbles_play(self):
-        sound = choice([self.bubbles_01,
-                       # self.bubbles_02,
-                       self.bubbles_03,
-                       # self.bubbles_04,
-                       self.bubbles_05,
-                       # self.bubbles_06,
-                       self.bubbles_07,
-                       # self.bubbles_08,
-                       self.bubbles_09])
-        # print(sound.fileName())
-        sound.play()
-
-    def play(self):
-        if self.parent.audio_on:
-            super(Sounds, self).play()
+    def load(self):
+        self._pending = [name for name in self.FILES if name not in self.effects]
+        QTimer.singleShot(0, self._load_next)
 
-    def toggle_sound(self, toggle: bool):
-        self.audio_on = toggle
+    def _load_next(self):
+        if not self._pending:
+            return
+        try:
+            from PyQt5.QtMultimedia import QSoundEffect
+        except ImportError as e:
+            print(f"Sound is off: {e}")
+            self._pending = []
+            return
+        name = self._pending.pop(0)
+        source = QUrl.fromLocalFile(os.path.abspath(self.FILES[name]))
+        voices = []
+        for _ in range(self.VOICES):
+            voice = QSoundEffect(self)
+            # Voices of one file share the decoded sample
+            voice.setSource(source)
+            voice.playingChanged.connect(partial(self._playing_changed, voice))
+            voices.append(voice)
+        self.effects[name] = voices
+        if self._pending:
+            QTimer.singleShot(0, self._load_next)
+
+    def is_loaded(self):
+        return bool(self.effects) and not self._pending
+
+    def play(self, name: str):
+        voices = self.effects.get(name)
+        if not self.audio_on or voices is None:
+            return
+        voice = self._free_voice(voices)
+        if voice.isPlaying():
+            voice.stop()
+        self._plays += 1
+        self._started[voice] = self._plays
+        if self.latencies is not None:
+            self._requested[voice] = perf_counter()
+        voice.play()
 
+    def _free_voice(self, voices):
+        """Idle voice or, when all of them are busy, the one playing longest"""
+        for voice in voices:
+            if not voice.isPlaying():
+                return voice
+        return min(voices, key=lambda voice: self._started.get(voice, 0))
 
-class GameSound(QSound):
-    def __init__(self, filename, parent):
-        super(GameSound, self).__init__(filename)
-        self.parent = parent
+    def _playing_changed(self, voice):
+        if voice.isPlaying() and voice in self._requested:
+            self.latencies.append(perf_counter() - self._requested.pop(voice))
 
-    def play(self):
-        if self.parent.audio_on:
-            super(GameSound, self).play()
+    def measure_latency(self, on: bool = True):
+        """Starts collecting delays between play requests, e.g. from cells_cleared, and playback start"""
+        self.latencies = [] if on else None
+        self._requested = {}
+
+    def latency_summary(self):
+        """Median and worst play latency in milliseconds"""
+        if not self.latencies:
+            return {}
+        return {"plays": len(self.latencies),
+                "median_ms": median(self.latencies) * 1e3,
+                "max_ms": max(self.latencies) * 1e3}
+
+    def bubbles_play(self):
+        self.play(choice(self.BUBBLES))
+
+    def tick2_play(self):
+        self.play("tick2")
+
+    def restart_play(self):
+        self.play("restart")
+
+    def toggle_sound(self, toggle: bool):
+        self.audio_on = toggle
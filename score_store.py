@@ -0,0 +1,205 @@
+"""Persistent high scores and history of finished games in an SQLite database.
+
+Writes go to a queue and are stored by a background thread in batches, one transaction per batch,
+so neither the UI nor simulation waits for the disk. The database is in WAL mode, so leaderboard
+queries from the caller's thread read while the writer is committing.
+
+Usage:
+    python score_store.py scores.db --height 10 --width 10 --colors 5
+"""
+import argparse
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    finished REAL NOT NULL,
+    source TEXT NOT NULL,
+    height INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    colors INTEGER NOT NULL,
+    items_in_line INTEGER NOT NULL,
+    seed INTEGER,
+    score INTEGER NOT NULL,
+    moves INTEGER NOT NULL,
+    duration REAL,
+    replay BLOB
+);
+CREATE INDEX IF NOT EXISTS games_leaderboard ON games (height, width, colors, score DESC);
+CREATE INDEX IF NOT EXISTS games_finished ON games (finished);
+"""
+FIELDS = ("finished", "source", "height", "width", "colors", "items_in_line", "seed", "score", "moves",
+          "duration", "replay")
+INSERT = f"INSERT INTO games ({', '.join(FIELDS)}) VALUES ({', '.join('?' * len(FIELDS))})"
+
+
+class ScoreStore:
+    """Batched asynchronous writer and reader of finished games.
+
+    add_game() and add_games() only put rows into a queue. The writer thread takes everything
+    queued up to BATCH_SIZE rows at once and inserts it in one transaction.
+    flush() waits until queued rows are committed, close() flushes and stops the thread.
+    When the database can not be opened, error holds the reason, writes are dropped
+    and queries raise sqlite3.Error, nothing waits for the writer.
+    """
+    BATCH_SIZE = 10000
+    _STOP = None
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue = queue.Queue()
+        self._ready = threading.Event()
+        self._reader = None
+        self.error = None
+        self._thread = threading.Thread(target=self._write_loop, name="ScoreStore", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode commits stay durable across application crashes with NORMAL, fsync is done on checkpoints
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _write_loop(self):
+        connection = None
+        try:
+            connection = self._connect()
+            connection.executescript(SCHEMA)
+        except sqlite3.Error as e:
+            self.error = e
+            print(f"Scores are not saved: {e}")
+            if connection is not None:
+                connection.close()
+            self._drop_queued()
+            return
+        finally:
+            self._ready.set()
+        stop = False
+        while not stop:
+            chunks = [self._queue.get()]
+            rows = len(chunks[0] or ())
+            while rows < self.BATCH_SIZE:
+                try:
+                    chunk = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                chunks.append(chunk)
+                rows += len(chunk or ())
+            stop = self._STOP in chunks
+            try:
+                with connection:
+                    for chunk in chunks:
+                        if chunk is not self._STOP:
+                            connection.executemany(INSERT, chunk)
+            except sqlite3.Error as e:
+                print(f"Scores are not saved: {e}")
+            for _ in chunks:
+                self._queue.task_done()
+        connection.close()
+
+    def _drop_queued(self):
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+            self._queue.task_done()
+
+    @staticmethod
+    def row(height: int, width: int, colors: int, items_in_line: int, seed: int, score: int, moves: int,
+            duration: float = None, replay: bytes = None, source: str = "game", finished: float = None):
+        return (time.time() if finished is None else finished, source, height, width, colors, items_in_line,
+                seed, score, moves, duration, replay)
+
+    def add_game(self, *args, **kwargs):
+        """Queues one finished game, takes arguments of row()"""
+        if self.error is None:
+            self._queue.put([self.row(*args, **kwargs)])
+
+    def add_games(self, rows):
+        """Queues many rows made by row() at once"""
+        rows = list(rows)
+        if rows and self.error is None:
+            self._queue.put(rows)
+
+    def flush(self):
+        self._ready.wait()
+        if self.error is None:
+            self._queue.join()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _query(self, sql: str, parameters=()):
+        """Runs a query on the reader connection of the thread which made the first query"""
+        if self._reader is None:
+            self._ready.wait()
+            if self.error is not None:
+                raise sqlite3.OperationalError(f"Score database {self.path} is not available: {self.error}")
+            self._reader = self._connect()
+            self._reader.row_factory = sqlite3.Row
+        return self._reader.execute(sql, parameters).fetchall()
+
+    def leaderboard(self, height: int, width: int, colors: int, limit: int = 10, source: str = None):
+        """Best games on a board of given size and colors, optionally only from one source"""
+        sql = ("SELECT id, finished, source, seed, score, moves, duration FROM games "
+               "WHERE height = ? AND width = ? AND colors = ?")
+        parameters = [height, width, colors]
+        if source is not None:
+            sql += " AND source = ?"
+            parameters.append(source)
+        return self._query(sql + " ORDER BY score DESC LIMIT ?", parameters + [limit])
+
+    def best_score(self, height: int, width: int, colors: int):
+        """Best score on a board of given size and colors, 0 when no games were played"""
+        rows = self._query("SELECT MAX(score) FROM games WHERE height = ? AND width = ? AND colors = ?",
+                           (height, width, colors))
+        return rows[0][0] or 0
+
+    def recent_games(self, limit: int = 10):
+        return self._query("SELECT id, finished, source, height, width, colors, seed, score, moves, duration "
+                           "FROM games ORDER BY finished DESC LIMIT ?", (limit,))
+
+    def count(self):
+        return self._query("SELECT COUNT(*) FROM games")[0][0]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Show leaderboard of a score database")
+    parser.add_argument("path")
+    parser.add_argument("--height", type=int, default=10)
+    parser.add_argument("--width", type=int, default=10)
+    parser.add_argument("--colors", type=int, default=5)
+    parser.add_argument("--source", help="only games of this source, e.g. game or simulate")
+    parser.add_argument("--limit", type=int, default=10)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with ScoreStore(args.path) as store:
+        print(f"{store.count()} games, best on {args.height}x{args.width} with {args.colors} colors:")
+        for row in store.leaderboard(args.height, args.width, args.colors, args.limit, args.source):
+            played = time.strftime("%Y-%m-%d %H:%M", time.localtime(row["finished"]))
+            print(f"{row['score']:>8} in {row['moves']:>4} moves  seed {row['seed']:<10} {row['source']:<10} {played}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""Headless game server: many independent games in one asyncio event loop.
+
+Sessions are BoardEngine games, a click settles the board at once as BoardEngine.click does,
+so no Qt objects or timers are involved. Clients speak the binary protocol of protocol.py
+over local TCP or a Unix socket, requests of one connection are answered in order.
+A session belongs to the connection which opened it and is closed when that connection drops.
+
+Usage:
+    python server.py --port 8765
+    python server.py --unix /tmp/bubbles.sock
+"""
+import argparse
+import asyncio
+import logging
+import struct
+import sys
+
+import numpy as np
+
+import protocol
+from board_engine import BoardEngine
+
+log = logging.getLogger("server")
+
+
+class ChangedCells:
+    """Collects cells written by BoardEngine.set_cells, plugged in as engine.write_listener"""
+    __slots__ = ("_cells", "_before")
+
+    def __init__(self):
+        self._cells = []
+        self._before = []
+
+    def touch(self, flat_cells, before):
+        self._cells.append(np.asarray(flat_cells, dtype=np.uint32))
+        self._before.append(np.asarray(before, dtype=np.int8))
+
+    def take(self, board):
+        """Returns (flat cells, colors) which differ from their values before the first write"""
+        if not self._cells:
+            return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int8)
+        cells, first = np.unique(np.concatenate(self._cells), return_index=True)
+        before = np.concatenate(self._before)[first]
+        self._cells.clear()
+        self._before.clear()
+        after = board.ravel()[cells]
+        changed = before != after
+        return cells[changed], after[changed]
+
+
+class Session:
+    __slots__ = ("engine", "changes", "score", "moves")
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.changes = ChangedCells()
+        engine.write_listener = self.changes
+        self.score = 0
+        self.moves = 0
+
+    @property
+    def over(self):
+        return not self.engine.is_same_cells_present()
+
+
+class GameServer:
+    MAX_SESSIONS = 100000
+    MAX_SIDE = 1000
+    MAX_COLORS = 16
+    # Pending connections, load tests open thousands at once
+    BACKLOG = 4096
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self.sessions = {}
+        self.next_session = 1
+        self.requests = 0
+        self.handlers = {
+            protocol.NEW: self.new_game,
+            protocol.CLICK: self.click,
+            protocol.BOARD: self.board,
+            protocol.CLOSE: self.close,
+        }
+
+    def handle(self, opcode: int, payload: bytes, owned: set):
+        """Returns response frame to a request frame of a connection owning session ids in owned"""
+        self.requests += 1
+        handler = self.handlers.get(opcode)
+        if handler is None:
+            return protocol.error_response(protocol.ERROR_BAD_REQUEST, f"Unknown opcode {opcode}")
+        try:
+            return handler(payload, owned)
+        except struct.error as e:
+            return protocol.error_response(protocol.ERROR_BAD_REQUEST, str(e))
+        except KeyError as e:
+            return protocol.error_response(protocol.ERROR_NO_SESSION, f"No session {e}")
+        except Exception as e:
+            log.exception("Request %#x failed", opcode)
+            return protocol.error_response(protocol.ERROR_BAD_REQUEST, f"Request failed: {e}")
+
+    def session(self, session_id: int, owned: set):
+        """Returns session of the connection, raises KeyError for unknown ids and sessions of other connections"""
+        if session_id not in owned:
+            raise KeyError(session_id)
+        return self.sessions[session_id]
+
+    def game_response(self, session_id: int, session: Session):
+        return protocol.game_response(session_id, session.engine.cells, session.score, session.moves, session.over)
+
+    def new_game(self, payload, owned: set):
+        height, width, colors, items_in_line, seeded, seed = protocol.NEW_REQUEST.unpack(payload)
+        if not (0 < height <= self.MAX_SIDE and 0 < width <= self.MAX_SIDE and 0 < colors <= self.MAX_COLORS
+                and items_in_line > 0):
+            return protocol.error_response(protocol.ERROR_BAD_REQUEST, "Board parameters are out of range")
+        if len(self.sessions) >= self.max_sessions:
+            return protocol.error_response(protocol.ERROR_TOO_MANY_SESSIONS,
+                                           f"{self.max_sessions} sessions are open already")
+        engine = BoardEngine(height, width, colors, items_in_line, seed=seed if seeded else None)
+        engine.fill()
+        session = Session(engine)
+        session_id = self.next_session
+        self.next_session += 1
+        self.sessions[session_id] = session
+        owned.add(session_id)
+        return self.game_response(session_id, session)
+
+    def click(self, payload, owned: set):
+        session_id, y, x = protocol.CLICK_REQUEST.unpack(payload)
+        session = self.session(session_id, owned)
+        engine = session.engine
+        if not (y < engine.height and x < engine.width):
+            return protocol.error_response(protocol.ERROR_BAD_REQUEST, f"Cell ({y}, {x}) is out of board")
+        cleared = engine.click(y, x)
+        if cleared:
+            session.score += cleared * cleared
+            session.moves += 1
+        cells, colors = session.changes.take(engine.cells)
+        return protocol.diff_response(session_id, cleared, session.score, session.moves, session.over, cells, colors)
+
+    def board(self, payload, owned: set):
+        session_id, = protocol.SESSION.unpack(payload)
+        return self.game_response(session_id, self.session(session_id, owned))
+
+    def close(self, payload, owned: set):
+        session_id, = protocol.SESSION.unpack(payload)
+        self.session(session_id, owned)
+        owned.discard(session_id)
+        del self.sessions[session_id]
+        return protocol.frame(protocol.CLOSED, payload)
+
+    def close_all(self, owned: set):
+        for session_id in owned:
+            self.sessions.pop(session_id, None)
+        owned.clear()
+
+    async def serve_client(self, reader, writer):
+        owned = set()
+        try:
+            while True:
+                opcode, payload = await protocol.read_frame(reader)
+                writer.write(self.handle(opcode, payload, owned))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self.close_all(owned)
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765, path: str = None):
+        """Starts listening on a Unix socket when path is given, on TCP host:port otherwise"""
+        if path:
+            return await asyncio.start_unix_server(self.serve_client, path=path, backlog=self.BACKLOG)
+        return await asyncio.start_server(self.serve_client, host, port, backlog=self.BACKLOG)
+
+
+async def serve(host: str, port: int, path: str = None, max_sessions: int = GameServer.MAX_SESSIONS):
+    game_server = GameServer(max_sessions)
+    server = await game_server.start(host, port, path)
+    print(f"Serving on {path or f'{host}:{port}'}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve headless games over local TCP or Unix socket")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="Unix socket path to listen on instead of TCP")
+    parser.add_argument("--max-sessions", type=int, default=GameServer.MAX_SESSIONS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.max_sessions))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
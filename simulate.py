@@ -0,0 +1,167 @@
+"""Headless batch simulation of games, no display or QApplication needed.
+
+Usage: python simulate.py --games 1000 --policy greedy --difficulty HARD --colors 5 --seed 1
+       python simulate.py --games 1000 --replays games.bin
+       python simulate.py --games 1000 --positions boards.snap
+       python simulate.py --games 100000 --scores scores.db
+"""
+import argparse
+import random
+import sys
+from importlib import import_module
+from time import perf_counter
+
+import numpy as np
+
+from board_engine import BoardEngine
+from enums import GameDifficulty
+from replay import write_replays
+from score_store import ScoreStore
+from snapshot import Snapshots
+
+
+def clickable_groups(engine):
+    """Returns labels of groups which can be cleared and (labels, sizes, members, starts) of the board"""
+    groups = engine.label_groups()
+    sizes = groups[1]
+    return np.flatnonzero(sizes >= engine.items_in_line), groups
+
+
+def group_cell(engine, groups, label):
+    _, _, members, starts = groups
+    return divmod(int(members[starts[label]]), engine.width)
+
+
+def random_policy(engine, rng):
+    labels, groups = clickable_groups(engine)
+    return group_cell(engine, groups, labels[rng.randrange(len(labels))])
+
+
+def greedy_policy(engine, rng):
+    """Clicks the largest group"""
+    labels, groups = clickable_groups(engine)
+    sizes = groups[1]
+    return group_cell(engine, groups, labels[np.argmax(sizes[labels])])
+
+
+POLICIES = {
+    "random": random_policy,
+    "greedy": greedy_policy,
+}
+
+
+def load_policy(name: str):
+    """Returns policy by name or by 'module:function' path of a plugged-in function(engine, rng) -> (y, x)"""
+    if name in POLICIES:
+        return POLICIES[name]
+    module_name, _, function_name = name.partition(":")
+    if not function_name:
+        raise ValueError(f"Unknown policy {name!r}, use one of {sorted(POLICIES)} or 'module:function'")
+    return getattr(import_module(module_name), function_name)
+
+
+def play_game(engine, policy, rng, max_moves: int = 10000):
+    """Plays one game on a filled engine until no moves are left. Returns (score, moves)"""
+    score = moves = 0
+    while moves < max_moves and engine.is_same_cells_present():
+        y, x = policy(engine, rng)
+        cleared = engine.click(y, x)
+        if cleared == 0:
+            raise ValueError(f"Policy clicked cell ({y}, {x}) which can not be cleared")
+        score += cleared * cleared
+        moves += 1
+    return score, moves
+
+
+def simulate(games: int, height: int, width: int, colors: int, items_in_line: int = 2,
+             policy=greedy_policy, seed: int = 0, max_moves: int = 10000, replays: list = None,
+             positions: Snapshots = None, store=None):
+    """Plays given number of games, returns arrays of scores and moves.
+    Replay logs of the games are appended to replays list when it is given.
+    With positions games start from the stored boards in turn instead of random ones.
+    Games are queued to score_store.ScoreStore when store is given"""
+    rng = random.Random(seed)
+    scores = np.zeros(games, dtype=np.int64)
+    moves = np.zeros(games, dtype=np.int64)
+    rows = []
+    for game in range(games):
+        engine = BoardEngine(height, width, colors, items_in_line, seed=rng.getrandbits(32))
+        engine.record_replay = replays is not None
+        if positions is None:
+            engine.fill()
+        else:
+            index = game % len(positions)
+            engine.colors_count = int(positions.records["colors"][index])
+            engine.load_cells(positions.cells(index))
+        start = perf_counter()
+        scores[game], moves[game] = play_game(engine, policy, rng, max_moves)
+        if engine.replay_log is not None:
+            replays.append(engine.replay_log)
+        if store is not None:
+            rows.append(store.row(height, width, engine.colors_count, items_in_line, engine.seed,
+                                  int(scores[game]), int(moves[game]), perf_counter() - start, source="simulate"))
+            if len(rows) >= store.BATCH_SIZE:
+                store.add_games(rows)
+                rows = []
+    if store is not None:
+        store.add_games(rows)
+    return scores, moves
+
+
+def report(scores, moves, elapsed: float):
+    p25, p50, p75, p90 = np.percentile(scores, [25, 50, 75, 90])
+    lines = [
+        f"Games:          {len(scores)}",
+        f"Score mean:     {scores.mean():.1f} (std {scores.std():.1f})",
+        f"Score min/max:  {scores.min()} / {scores.max()}",
+        f"Score p25/p50/p75/p90: {p25:.0f} / {p50:.0f} / {p75:.0f} / {p90:.0f}",
+        f"Moves per game: {moves.mean():.1f}",
+        f"Games per sec:  {len(scores) / elapsed:.1f}",
+    ]
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run games without GUI and report score statistics")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--policy", default="greedy",
+                        help=f"one of {sorted(POLICIES)} or 'module:function' of a plugged-in policy")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--difficulty", choices=[d.name for d in GameDifficulty], default=GameDifficulty.EASY.name)
+    parser.add_argument("--height", type=int, help="overrides height of --difficulty")
+    parser.add_argument("--width", type=int, help="overrides width of --difficulty")
+    parser.add_argument("--colors", type=int, default=5)
+    parser.add_argument("--items-in-line", type=int, default=2)
+    parser.add_argument("--max-moves", type=int, default=10000)
+    parser.add_argument("--replays", help="file to append replay logs of played games to")
+    parser.add_argument("--positions", help="snapshot file with starting boards, overrides board size")
+    parser.add_argument("--scores", help="SQLite score database to add played games to")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    height, width = GameDifficulty[args.difficulty].value
+    height = args.height or height
+    width = args.width or width
+    positions = None
+    if args.positions:
+        positions = Snapshots(args.positions)
+        height, width = positions.height, positions.width
+
+    replays = [] if args.replays else None
+    store = ScoreStore(args.scores) if args.scores else None
+    start = perf_counter()
+    scores, moves = simulate(args.games, height, width, args.colors, args.items_in_line,
+                             load_policy(args.policy), args.seed, args.max_moves, replays, positions, store)
+    elapsed = perf_counter() - start
+    if store is not None:
+        store.close()
+    if replays:
+        write_replays(args.replays, replays)
+    print(f"Board {height}x{width}, {args.colors} colors, policy {args.policy}, seed {args.seed}")
+    print(report(scores, moves, elapsed))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""Bit-packed board snapshots stored as fixed-size records of one file.
+
+File starts with a 16 bytes header: magic b"BBSN", version, height, width and bits per cell.
+Every record holds score, move count, palette size, palette as indexes into a colors list
+and cells packed with as few bits as the biggest palette of the file needs.
+Files are read through a memory map as a numpy structured array, cells of any slice
+of records are unpacked at once without building game objects.
+"""
+import struct
+
+import numpy as np
+
+MAGIC = b"BBSN"
+VERSION = 1
+HEADER = struct.Struct("<4sBHHB6x")
+PALETTE_SLOTS = 16
+
+
+def bits_for(colors: int):
+    """Bits needed for color indexes 0..colors, 0 being an empty cell"""
+    return max(1, int(colors).bit_length())
+
+
+def record_dtype(height: int, width: int, bits: int):
+    return np.dtype([
+        ("score", "<u8"),
+        ("moves", "<u4"),
+        ("colors", "u1"),
+        ("palette", "u1", (PALETTE_SLOTS,)),
+        ("cells", "u1", ((height * width * bits + 7) // 8,)),
+    ])
+
+
+def pack_cells(cells, bits: int):
+    """Packs array of color indexes (..., height, width) into bytes (..., packed size)"""
+    cells = np.asarray(cells, dtype=np.uint8)
+    flat = cells.reshape(cells.shape[:-2] + (-1,))
+    shifts = np.arange(bits - 1, -1, -1, dtype=np.uint8)
+    planes = (flat[..., None] >> shifts) & 1
+    return np.packbits(planes.reshape(flat.shape[:-1] + (-1,)), axis=-1)
+
+
+def unpack_cells(packed, height: int, width: int, bits: int):
+    """Inverse of pack_cells, returns int8 array (..., height, width)"""
+    packed = np.asarray(packed, dtype=np.uint8)
+    count = height * width
+    planes = np.unpackbits(packed, axis=-1, count=count * bits)
+    planes = planes.reshape(packed.shape[:-1] + (count, bits))
+    weights = (1 << np.arange(bits - 1, -1, -1)).astype(np.uint8)
+    values = (planes * weights).sum(axis=-1, dtype=np.uint8)
+    return values.astype(np.int8).reshape(packed.shape[:-1] + (height, width))
+
+
+class SnapshotWriter:
+    """Appends board records to a new snapshot file, used as a context manager"""
+
+    def __init__(self, path: str, height: int, width: int, colors: int):
+        self.height = height
+        self.width = width
+        self.bits = bits_for(colors)
+        self.dtype = record_dtype(height, width, self.bits)
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, height, width, self.bits))
+
+    def write(self, cells, palette, score: int = 0, moves: int = 0):
+        """Adds a board, palette is a list of indexes of its colors"""
+        if len(palette) > PALETTE_SLOTS:
+            raise ValueError(f"Palette of {len(palette)} colors does not fit {PALETTE_SLOTS} slots")
+        record = np.zeros(1, dtype=self.dtype)
+        record["score"] = score
+        record["moves"] = moves
+        record["colors"] = len(palette)
+        record["palette"][0, :len(palette)] = palette
+        record["cells"][0] = pack_cells(cells, self.bits)
+        self.file.write(record.tobytes())
+
+    def write_many(self, cells, palettes, scores, moves):
+        """Adds boards (count, height, width) with palettes (count, colors) in one write"""
+        palettes = np.asarray(palettes, dtype=np.uint8)
+        records = np.zeros(len(cells), dtype=self.dtype)
+        records["score"] = scores
+        records["moves"] = moves
+        records["colors"] = palettes.shape[1]
+        records["palette"][:, :palettes.shape[1]] = palettes
+        records["cells"] = pack_cells(cells, self.bits)
+        self.file.write(records.tobytes())
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class Snapshots:
+    """Memory-mapped records of a snapshot file"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            magic, version, self.height, self.width, self.bits = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a board snapshot file")
+        if version != VERSION:
+            raise ValueError(f"Unsupported snapshot version {version}")
+        self.records = np.memmap(path, dtype=record_dtype(self.height, self.width, self.bits),
+                                 mode="r", offset=HEADER.size)
+
+    def __len__(self):
+        return len(self.records)
+
+    def cells(self, index=slice(None)):
+        """Unpacked cells of a record (height, width) or of a slice of records (count, height, width)"""
+        return unpack_cells(self.records["cells"][index], self.height, self.width, self.bits)
+
+    def palette(self, index: int):
+        return self.records["palette"][index, :self.records["colors"][index]].tolist()
+
+    def score(self, index: int):
+        return int(self.records["score"][index])
+
+    def moves(self, index: int):
+        return int(self.records["moves"][index])
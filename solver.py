@@ -0,0 +1,153 @@
+from random import Random
+from time import perf_counter
+
+from board_engine import BoardEngine
+
+
+def board_to_columns(cells):
+    """Converts engine cells to compact position: tuple of non-empty columns as bytes from bottom to top.
+    Returns position and x of every column on the board"""
+    columns, xs = [], []
+    for x in range(cells.shape[1]):
+        column = cells[::-1, x]
+        column = bytes(column[column != BoardEngine.EMPTY].tolist())
+        if column:
+            columns.append(column)
+            xs.append(x)
+    return tuple(columns), xs
+
+
+def find_groups(columns, min_size: int = 2):
+    """Returns groups of at least min_size same color items as lists of (column, height)"""
+    seen = [bytearray(len(column)) for column in columns]
+    last = len(columns) - 1
+    groups = []
+    for i, column in enumerate(columns):
+        for j, color in enumerate(column):
+            if seen[i][j]:
+                continue
+            seen[i][j] = 1
+            group = [(i, j)]
+            for ci, cj in group:
+                for ni, nj in ((ci, cj + 1), (ci + 1, cj), (ci, cj - 1), (ci - 1, cj)):
+                    if 0 <= ni <= last and 0 <= nj < len(columns[ni]) and not seen[ni][nj] \
+                            and columns[ni][nj] == color:
+                        seen[ni][nj] = 1
+                        group.append((ni, nj))
+            if len(group) >= min_size:
+                groups.append(group)
+    return groups
+
+
+def play(columns, group):
+    """Returns position after group was removed, items fall down and empty columns are dropped"""
+    removed = {}
+    for i, j in group:
+        removed.setdefault(i, set()).add(j)
+    new_columns = list(columns)
+    for i, heights in removed.items():
+        new_columns[i] = bytes(color for j, color in enumerate(columns[i]) if j not in heights)
+    return tuple(column for column in new_columns if column)
+
+
+class MoveSearch:
+    """Beam search for the click starting the line with best score, positions are deduplicated
+    with Zobrist hashes. Beam is ordered by score plus optimistic estimate of the rest of the board"""
+    BEAM_WIDTH = 64
+
+    def __init__(self, height: int, width: int, colors: int, items_in_line: int = 2, seed: int = 0):
+        self.height = height
+        self.width = width
+        self.items_in_line = items_in_line
+        rng = Random(seed)
+        # Key of a cell is its column counted from the right and its height, board is aligned to the right
+        self.zobrist_table = [[rng.getrandbits(64) for _ in range(colors + 1)]
+                              for _ in range(height * width)]
+        self._column_hashes = {}
+        self.positions_evaluated = 0
+        self.best_score = 0
+
+    def column_hash(self, position: int, column: bytes):
+        key = (position, column)
+        column_hash = self._column_hashes.get(key)
+        if column_hash is None:
+            column_hash = 0
+            table = self.zobrist_table
+            base = position * self.height
+            for j, color in enumerate(column):
+                column_hash ^= table[base + j][color]
+            self._column_hashes[key] = column_hash
+        return column_hash
+
+    def zobrist_hash(self, columns):
+        board_hash = 0
+        last = len(columns) - 1
+        for i, column in enumerate(columns):
+            board_hash ^= self.column_hash(last - i, column)
+        return board_hash
+
+    def is_spawn_pending(self, columns):
+        """New row is spawned once top row is empty, what comes next is unknown to the search"""
+        return all(len(column) < self.height for column in columns)
+
+    @staticmethod
+    def color_counts(columns):
+        counts = {}
+        for column in columns:
+            for color in set(column):
+                counts[color] = counts.get(color, 0) + column.count(color)
+        return counts
+
+    @staticmethod
+    def estimate(counts):
+        """Optimistic bonus for items left: as if all items of each color were joined in one group"""
+        return sum((n - 2) * (n - 2) for n in counts.values() if n > 2) // 4
+
+    def best_move(self, columns, budget_ms: int = 200):
+        """Returns first group of the best line found within budget, or None if there are no moves"""
+        deadline = perf_counter() + budget_ms / 1000
+        self.positions_evaluated = 0
+        self.best_score = 0
+
+        transpositions = {self.zobrist_hash(columns): 0}
+        best_move = None
+        beam = [(0, columns, self.color_counts(columns), None)]
+        while beam and perf_counter() < deadline:
+            candidates = []
+            for score, position, counts, first_move in beam:
+                for group in find_groups(position, self.items_in_line):
+                    child = play(position, group)
+                    child_score = score + len(group) * len(group)
+                    child_hash = self.zobrist_hash(child)
+                    if transpositions.get(child_hash, -1) >= child_score:
+                        continue
+                    transpositions[child_hash] = child_score
+                    self.positions_evaluated += 1
+
+                    move = first_move or group
+                    if best_move is None or child_score > self.best_score:
+                        best_move, self.best_score = move, child_score
+                    if not self.is_spawn_pending(child):
+                        i, j = group[0]
+                        child_counts = dict(counts)
+                        child_counts[position[i][j]] -= len(group)
+                        value = child_score + self.estimate(child_counts)
+                        candidates.append((value, child_score, child, child_counts, move))
+                if perf_counter() >= deadline:
+                    break
+            candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+            beam = [candidate[1:] for candidate in candidates[:self.BEAM_WIDTH]]
+        return best_move
+
+
+def suggest_move(field, budget_ms: int = 200):
+    """Returns (y, x) of the cell GameField should click next, or None if no moves are left.
+    Falling items are taken as already landed"""
+    engine = field.engine
+    columns, xs = board_to_columns(engine.cells)
+    search = MoveSearch(engine.height, engine.width, engine.colors_count, engine.items_in_line)
+    group = search.best_move(columns, budget_ms)
+    if group is None:
+        return None
+    i, j = group[0]
+    return engine.height - 1 - j, xs[i]
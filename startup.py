@@ -0,0 +1,108 @@
+"""Cold start benchmark: time from process start to the first painted frame of MainWindow.
+
+Every run starts a fresh interpreter, which reports wall clock time of its phases.
+
+Usage:
+    python startup.py --runs 10 --output startup_baseline.json
+    python startup.py --compare startup_baseline.json --threshold 0.25
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from operator import itemgetter
+from statistics import median
+
+from benchtools import check_baseline
+
+PHASES = ["imports", "window", "first_frame"]
+
+
+def child():
+    """Runs in the measured process: starts the game as game.py does and reports phase times"""
+    marks = {}
+    from PyQt5.QtWidgets import QApplication
+    from qt_widgets import MainWindow
+    marks["imports"] = time.time()
+
+    app = QApplication(sys.argv)
+    window = MainWindow()
+    marks["window"] = time.time()
+
+    def first_frame():
+        marks["first_frame"] = time.time()
+        print(json.dumps(marks), flush=True)
+        # Nothing after the first frame is measured, skip the teardown
+        os._exit(0)
+
+    window.first_frame_shown.connect(first_frame)
+    app.exec_()
+
+
+def run_once(platform_name: str = None):
+    """Returns seconds from process start to every phase"""
+    env = dict(os.environ)
+    if platform_name:
+        env["QT_QPA_PLATFORM"] = platform_name
+    start = time.time()
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"],
+                            cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                            capture_output=True, text=True, check=True).stdout
+    marks = json.loads(output.strip().splitlines()[-1])
+    return {phase: marks[phase] - start for phase in PHASES}
+
+
+def run(runs: int, platform_name: str = None):
+    timings = {phase: [] for phase in PHASES}
+    for _ in range(runs):
+        for phase, seconds in run_once(platform_name).items():
+            timings[phase].append(seconds)
+    results = [{"phase": phase, "runs": runs, "median_ms": median(values) * 1e3, "min_ms": min(values) * 1e3}
+               for phase, values in timings.items()]
+    for result in results:
+        print(f"{result['phase']:>12}: median {result['median_ms']:>8.1f} ms, min {result['min_ms']:>8.1f} ms")
+    return {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure time to first painted frame of the game window")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--platform", help="Qt platform plugin, e.g. offscreen on machines without display")
+    parser.add_argument("--output", help="JSON file to save results to")
+    parser.add_argument("--compare", help="JSON file with baseline results")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative slowdown of median reported as regression")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.child:
+        child()
+        return 0
+
+    current = run(args.runs, args.platform)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+
+    if args.compare:
+        return check_baseline(args.compare, current, args.threshold, key=itemgetter("phase"),
+                              label=lambda result: f"{result['phase']:>12}", field="median_ms", unit="ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""Multi-process self-play over a sweep of board sizes, color counts and policies.
+
+Every game has its own seed derived from the master seed and the game position in the sweep,
+so results do not depend on the number of processes, chunk size or on the order games finish in.
+Workers play chunks of games and send back their statistics instead of per-game results.
+
+Usage: python sweep.py --sizes 10x10 15x15 --colors 4 5 --policies greedy random --games 10000 --seed 1
+"""
+import argparse
+import csv
+import random
+import sys
+from collections import deque
+from itertools import product
+from multiprocessing import Pool, cpu_count
+from time import perf_counter
+
+import numpy as np
+
+from benchtools import parse_size
+from board_engine import BoardEngine
+from simulate import load_policy, play_game
+
+# Games played by a worker per task, seeds and results of a chunk travel in one message
+CHUNK_GAMES = 64
+# Chunks submitted ahead per process
+IN_FLIGHT = 4
+
+
+class SweepSummary:
+    """Running statistics per sweep configuration, merged from chunks of games as they finish"""
+
+    def __init__(self, configs):
+        self.configs = configs
+        count = len(configs)
+        self.games = np.zeros(count, dtype=np.int64)
+        self.score_sum = np.zeros(count, dtype=np.float64)
+        self.score_sq_sum = np.zeros(count, dtype=np.float64)
+        self.score_min = np.full(count, np.iinfo(np.int64).max, dtype=np.int64)
+        self.score_max = np.zeros(count, dtype=np.int64)
+        self.moves_sum = np.zeros(count, dtype=np.float64)
+
+    def add(self, config_index: int, stats):
+        """Merges stats of a chunk of games made by chunk_stats()"""
+        games, score_sum, score_sq_sum, score_min, score_max, moves_sum = stats
+        self.games[config_index] += games
+        self.score_sum[config_index] += score_sum
+        self.score_sq_sum[config_index] += score_sq_sum
+        self.score_min[config_index] = min(self.score_min[config_index], score_min)
+        self.score_max[config_index] = max(self.score_max[config_index], score_max)
+        self.moves_sum[config_index] += moves_sum
+
+    def report(self, elapsed: float):
+        lines = [f"{'height':>6} {'width':>5} {'colors':>6} {'policy':>10} {'games':>8} "
+                 f"{'mean':>9} {'std':>9} {'min':>7} {'max':>7} {'moves':>7}"]
+        for i, (height, width, colors, policy) in enumerate(self.configs):
+            games = self.games[i]
+            if games == 0:
+                continue
+            mean = self.score_sum[i] / games
+            std = np.sqrt(max(self.score_sq_sum[i] / games - mean * mean, 0))
+            lines.append(f"{height:>6} {width:>5} {colors:>6} {policy:>10} {games:>8} "
+                         f"{mean:>9.1f} {std:>9.1f} {self.score_min[i]:>7} {self.score_max[i]:>7} "
+                         f"{self.moves_sum[i] / games:>7.1f}")
+        total = self.games.sum()
+        lines.append(f"{total} games in {elapsed:.1f}s, {total / elapsed:.1f} games per sec")
+        return "\n".join(lines)
+
+
+def chunk_stats(scores, moves):
+    """(games, score sum, score square sum, min, max, moves sum) of a chunk of games"""
+    scores = scores.astype(np.float64)
+    return len(scores), scores.sum(), (scores * scores).sum(), int(scores.min()), int(scores.max()), moves.sum()
+
+
+def game_seeds(master_seed: int, config_index: int, game: int):
+    """Board and policy seeds of one game, independent of how games are split into chunks"""
+    sequence = np.random.SeedSequence(master_seed, spawn_key=(config_index, game))
+    board_seed, policy_seed = sequence.generate_state(2, dtype=np.uint64).tolist()
+    return board_seed, policy_seed
+
+
+def iter_tasks(configs, games: int, master_seed: int, items_in_line: int, max_moves: int, chunk_games: int,
+               keep_games: bool = False):
+    """Tasks of chunk_games consecutive games of one configuration"""
+    for config_index, config in enumerate(configs):
+        for first_game in range(0, games, chunk_games):
+            yield (config_index, config, first_game, min(chunk_games, games - first_game), master_seed,
+                   items_in_line, max_moves, keep_games)
+
+
+def run_task(task):
+    """Plays a chunk of games in a worker process.
+    Returns (config_index, first_game, chunk_stats, scores, moves), the arrays only with keep_games"""
+    config_index, (height, width, colors, policy), first_game, count, master_seed, items_in_line, max_moves, \
+        keep_games = task
+    policy = load_policy(policy)
+    engine = BoardEngine(height, width, colors, items_in_line)
+    scores = np.zeros(count, dtype=np.int64)
+    moves = np.zeros(count, dtype=np.int64)
+    for i in range(count):
+        board_seed, policy_seed = game_seeds(master_seed, config_index, first_game + i)
+        engine.reseed(board_seed)
+        engine.fill()
+        scores[i], moves[i] = play_game(engine, policy, random.Random(policy_seed), max_moves)
+    stats = chunk_stats(scores, moves)
+    if not keep_games:
+        scores = moves = None
+    return config_index, first_game, stats, scores, moves
+
+
+def run_sweep(configs, games: int, master_seed: int = 0, items_in_line: int = 2, max_moves: int = 10000,
+              processes: int = None, chunk_games: int = CHUNK_GAMES, keep_games: bool = False):
+    """Plays games of every (height, width, colors, policy) configuration on a process pool.
+    Yields run_task() results of chunks in order of tasks. At most IN_FLIGHT chunks per process
+    are submitted at once, so memory does not grow with the number of games"""
+    tasks = iter_tasks(configs, games, master_seed, items_in_line, max_moves, chunk_games, keep_games)
+    processes = processes or cpu_count()
+    if processes == 1:
+        yield from map(run_task, tasks)
+        return
+    with Pool(processes) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.apply_async(run_task, (task,)))
+            if len(pending) >= processes * IN_FLIGHT:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run seeded self-play sweep on all cores")
+    parser.add_argument("--sizes", nargs="+", default=["10x10"], help="board sizes as HEIGHTxWIDTH")
+    parser.add_argument("--colors", nargs="+", type=int, default=[5])
+    parser.add_argument("--policies", nargs="+", default=["greedy"])
+    parser.add_argument("--games", type=int, default=1000, help="games per configuration")
+    parser.add_argument("--seed", type=int, default=0, help="master seed")
+    parser.add_argument("--items-in-line", type=int, default=2)
+    parser.add_argument("--max-moves", type=int, default=10000)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--chunk-games", type=int, default=CHUNK_GAMES, help="games per worker task")
+    parser.add_argument("--output", help="CSV file for per-game results")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configs = [(height, width, colors, policy) for (height, width), colors, policy
+               in product(map(parse_size, args.sizes), args.colors, args.policies)]
+    for policy in args.policies:
+        load_policy(policy)
+
+    summary = SweepSummary(configs)
+    output = open(args.output, "w", newline="") if args.output else None
+    writer = csv.writer(output) if output else None
+    if writer:
+        writer.writerow(["height", "width", "colors", "policy", "game", "score", "moves"])
+
+    start = perf_counter()
+    try:
+        for config_index, first_game, stats, scores, moves in run_sweep(
+                configs, args.games, args.seed, args.items_in_line, args.max_moves, args.processes,
+                args.chunk_games, keep_games=writer is not None):
+            summary.add(config_index, stats)
+            if writer:
+                writer.writerows([*configs[config_index], first_game + i, score, game_moves]
+                                 for i, (score, game_moves) in enumerate(zip(scores.tolist(), moves.tolist())))
+    finally:
+        if output:
+            output.close()
+    print(summary.report(perf_counter() - start))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,61 @@
-from itertools import chain
+from abc import ABC, abstractmethod
 
 import numpy as np
 
 
-class NpTableContainer:
+class TableContainer(ABC):
+    """Common interface of 2D tables indexed by [y, x], empty cells hold a falsy value"""
 
-    def __init__(self,  height: int,width: int):
+    def __init__(self, height: int, width: int):
         self.height = height
         self.width = width
-        self._container = np.empty((height, width), dtype=object)
+
+    @abstractmethod
+    def __getitem__(self, key):
+        pass
+
+    @abstractmethod
+    def __setitem__(self, key, value):
+        pass
+
+    def neighbours(self, y: int, x: int):
+        # Right, Down, Left, Up
+        for ny, nx in ((y, x + 1), (y + 1, x), (y, x - 1), (y - 1, x)):
+            if 0 <= ny < self.height and 0 <= nx < self.width:
+                yield ny, nx
+
+    def find_same_items(self, y: int, x: int):
+        """Returns list of (y, x) of the group of same values connected to given cell"""
+        value = self[y, x]
+        if not value:
+            return []
+        same_items = [(y, x)]
+        same_items_set = {(y, x)}
+        for cy, cx in same_items:
+            for cell in self.neighbours(cy, cx):
+                if cell not in same_items_set and self[cell] == value:
+                    same_items.append(cell)
+                    same_items_set.add(cell)
+        return same_items
+
+    def is_same_cells_present(self):
+        for y in range(self.height):
+            for x in range(self.width):
+                value = self[y, x]
+                if not value:
+                    continue
+                if x + 1 < self.width and self[y, x + 1] == value:
+                    return True
+                if y + 1 < self.height and self[y + 1, x] == value:
+                    return True
+        return False
+
+
+class NpTableContainer(TableContainer):
+
+    def __init__(self, height: int, width: int, dtype=object):
+        super(NpTableContainer, self).__init__(height, width)
+        self._container = np.empty((height, width), dtype=dtype)
 
     def __len__(self):
         return len(self._container)
@@ -23,11 +70,10 @@ class NpTableContainer:
         return self._container
 
 
-class PythonTableContainer:
+class PythonTableContainer(TableContainer):
 
     def __init__(self, height: int, width: int):
-        self.height = height
-        self.width = width
+        super(PythonTableContainer, self).__init__(height, width)
         self._container = [None for _ in range(self.height * self.width)]
 
     def __call__(self, *args, **kwargs):
@@ -53,19 +99,24 @@ class PythonTableContainer:
         if not x is None and not y is None:
             assert 0 <= x < self.width
             assert 0 <= y < self.height
-            pos = (y * self.height) + x
+            pos = (y * self.width) + x
 
-        if pos:
+        if pos is not None:
             if not 0 <= pos < len(self._container):
                 raise ValueError(
-                    f"Position {pos:1.} is out of boundaries 0-{len(self._container)} ({self.height}x{self.width})")
+                    f"Position {pos} is out of boundaries 0-{len(self._container)} ({self.height}x{self.width})")
             else:
                 return self._container[pos]
 
     def __setitem__(self, key, value):
+        if isinstance(key, tuple):
+            y, x = key
+            key = y * self.width + x
         self._container[key] = value
 
     def __getitem__(self, key):
+        if isinstance(key, tuple):
+            return self(*key)
         return self._container[key]
 
     def __len__(self):
@@ -109,25 +160,105 @@ class SlicesTableContainer(PythonTableContainer):
             else:
                 assert 0 <= x < self.width
                 assert 0 <= y < self.height
-                pos = (y * self.height) + x
+                pos = (y * self.width) + x
 
-        if pos:
+        if pos is not None:
             if not 0 <= pos < len(self._container):
                 raise ValueError(
-                    f"Position {pos:1.} is out of boundaries 0-{len(self._container)} ({self.height}x{self.width})")
+                    f"Position {pos} is out of boundaries 0-{len(self._container)} ({self.height}x{self.width})")
             else:
                 return self._container[pos]
 
+    def positions(self, y, x):
+        """Returns flat positions of cells selected by y and x, each of them may be a slice"""
+        y_range = range(self.height)[y]
+        x_range = range(self.width)[x]
+        if isinstance(y_range, int):
+            y_range = [y_range]
+        if isinstance(x_range, int):
+            x_range = [x_range]
+        return [self.width * i + j for i in y_range for j in x_range]
+
     def __setitem__(self, key, value):
         if isinstance(key, int):
             self._container[key] = value
         elif isinstance(key, tuple):
-            keys = self(*key)
-            for k in chain.from_iterable(keys):
-                k = value
+            for pos in self.positions(*key):
+                self._container[pos] = value
 
     def __getitem__(self, key):
         if isinstance(key, int):
             return self._container[key]
         elif isinstance(key, tuple):
             return self(*key)
+
+
+class BitboardTableContainer(TableContainer):
+    """Table of small positive ints kept as one Python int bitboard per value plus occupancy bitboard.
+
+    Rows are width + 1 bits long, the extra guard bit is never set, so shifts by one bit
+    do not wrap a group over the edge of the board.
+    """
+
+    def __init__(self, height: int, width: int):
+        super(BitboardTableContainer, self).__init__(height, width)
+        self.stride = width + 1
+        self.boards = {}
+        self.occupancy = 0
+
+    def bit(self, y: int, x: int):
+        return 1 << (y * self.stride + x)
+
+    def __getitem__(self, key):
+        bit = self.bit(*key)
+        if self.occupancy & bit:
+            for value, board in self.boards.items():
+                if board & bit:
+                    return value
+        return 0
+
+    def __setitem__(self, key, value):
+        bit = self.bit(*key)
+        if self.occupancy & bit:
+            for old_value, board in self.boards.items():
+                if board & bit:
+                    self.boards[old_value] = board & ~bit
+                    break
+            self.occupancy &= ~bit
+        if value:
+            self.boards[value] = self.boards.get(value, 0) | bit
+            self.occupancy |= bit
+
+    def cells(self, board: int):
+        """Returns list of (y, x) of bits set in board"""
+        cells = []
+        while board:
+            low = board & -board
+            cells.append(divmod(low.bit_length() - 1, self.stride))
+            board ^= low
+        return cells
+
+    def find_same_items(self, y: int, x: int):
+        value = self[y, x]
+        if not value:
+            return []
+        board = self.boards[value]
+        stride = self.stride
+        group = self.bit(y, x)
+        while True:
+            grown = group | ((group << 1) | (group >> 1) | (group << stride) | (group >> stride)) & board
+            if grown == group:
+                return self.cells(group)
+            group = grown
+
+    def is_same_cells_present(self):
+        stride = self.stride
+        return any(board & (board >> 1) or board & (board >> stride) for board in self.boards.values())
+
+
+BACKENDS = {
+    "numpy": NpTableContainer,
+    "python": PythonTableContainer,
+    "slices": SlicesTableContainer,
+    "bitboard": BitboardTableContainer,
+}
@@ -0,0 +1,127 @@
+"""BoardEngine compaction checked against gravity and column shift loops of the original cell_clicked, click timing"""
+from time import perf_counter
+
+import numpy as np
+import pytest
+
+from board_engine import BoardEngine
+from tableContainer import BACKENDS
+
+BACKEND_NAMES = [None] + sorted(BACKENDS)
+BOARDS_PER_BACKEND = 60
+CLICK_BUDGET = 2e-3
+
+
+def reference_clear(cells, same_items):
+    """Clears same_items on a copy of cells the way cell_clicked did before BoardEngine"""
+    cells = cells.copy()
+    height = cells.shape[0]
+    lines_to_shift_down = set()
+    for y, x in same_items:
+        cells[y, x] = BoardEngine.EMPTY
+        lines_to_shift_down.add(x)
+
+    for x in lines_to_shift_down:
+        for y in range(height - 1, 0, -1):
+            if cells[y, x]:
+                continue
+            cells_above = [y_above for y_above in range(y) if cells[y_above, x]]
+            if len(cells_above) == 0:
+                break
+            nearest_filled_y = max(cells_above)
+            cells[y, x] = cells[nearest_filled_y, x]
+            cells[nearest_filled_y, x] = BoardEngine.EMPTY
+
+    max_x = max(lines_to_shift_down)
+    for x in range(max_x, 0, -1):
+        if not cells[:, x].any():
+            for xn in range(x - 1, -1, -1):
+                if cells[:, xn].any():
+                    cells[:, x] = cells[:, xn]
+                    cells[:, xn] = BoardEngine.EMPTY
+                    break
+    return cells
+
+
+def check_pairs(engine):
+    """Pairs counter matches the board, only kept without a backend"""
+    same_pairs = engine.count_same_pairs()
+    if engine.table is None:
+        assert engine.same_pairs == same_pairs
+    assert engine.is_same_cells_present() == (same_pairs > 0)
+
+
+def clickable_cells(engine):
+    labels, sizes, _, _ = engine.label_groups()
+    return np.flatnonzero(sizes[labels] >= engine.items_in_line)
+
+
+@pytest.mark.parametrize("backend", BACKEND_NAMES)
+def test_clear_items_matches_reference(backend):
+    rng = np.random.default_rng(BACKEND_NAMES.index(backend))
+    for board in range(BOARDS_PER_BACKEND):
+        height, width = (int(side) for side in rng.integers(1, 16, size=2))
+        colors = int(rng.integers(1, 7))
+        engine = BoardEngine(height, width, colors, backend=backend, seed=board)
+        engine.fill()
+        check_pairs(engine)
+
+        clickable = clickable_cells(engine)
+        while len(clickable):
+            y, x = divmod(int(rng.choice(clickable)), width)
+            same_items = engine.find_same_items(y, x)
+            expected = reference_clear(engine.cells, same_items)
+            engine.clear_items(same_items)
+
+            np.testing.assert_array_equal(engine.cells, expected, err_msg=f"{height}x{width} board {board}")
+            check_pairs(engine)
+            clickable = clickable_cells(engine)
+
+
+@pytest.mark.parametrize("backend", BACKEND_NAMES)
+def test_click_spawns_row_on_empty_top(backend):
+    engine = BoardEngine(3, 4, 2, backend=backend, seed=1)
+    engine.load_cells(np.array([[0, 0, 0, 0],
+                                [0, 0, 0, 0],
+                                [1, 1, 2, 1]], dtype=np.int8))
+    assert engine.click(2, 0) == 2
+    check_pairs(engine)
+    assert np.count_nonzero(engine.cells) == 2 + engine.width
+
+
+@pytest.mark.parametrize("cells", [BoardEngine.SCALAR_WRITE_CELLS, BoardEngine.SCALAR_WRITE_CELLS + 1, 500])
+def test_set_cells_keeps_pairs_count(cells):
+    rng = np.random.default_rng(cells)
+    engine = BoardEngine(30, 40, 3, seed=cells)
+    engine.fill()
+    for _ in range(20):
+        flat = rng.choice(engine.cells.size, size=cells, replace=False)
+        ys, xs = np.divmod(flat, engine.width)
+        engine.set_cells(ys, xs, rng.integers(0, 4, size=cells).astype(np.int8))
+        check_pairs(engine)
+
+
+def click_median(height, width, clicks=100):
+    """Median seconds of BoardEngine.click on random clickable cells"""
+    engine = BoardEngine(height, width, 5, seed=1)
+    engine.fill()
+    rng = np.random.default_rng(0)
+    times = []
+    for _ in range(clicks):
+        if not engine.is_same_cells_present():
+            engine.fill()
+        cells = engine.cells
+        same = np.zeros(cells.shape, dtype=bool)
+        same[:, 1:] = (cells[:, 1:] == cells[:, :-1]) & (cells[:, 1:] != BoardEngine.EMPTY)
+        same[1:, :] |= (cells[1:, :] == cells[:-1, :]) & (cells[1:, :] != BoardEngine.EMPTY)
+        y, x = divmod(int(rng.choice(np.flatnonzero(same))), width)
+        start = perf_counter()
+        engine.click(y, x)
+        times.append(perf_counter() - start)
+    return float(np.median(times))
+
+
+@pytest.mark.parametrize("height, width", [(100, 100), (500, 500)])
+def test_click_median(height, width):
+    # A click used to label the whole board and took about 2 ms on both sizes
+    assert click_median(height, width) < CLICK_BUDGET
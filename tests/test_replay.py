@@ -0,0 +1,40 @@
+"""Games recorded while items are falling replay to the same board and score"""
+import numpy as np
+import pytest
+
+from replay import ReplayLog
+from replayer import replay
+
+QtCore = pytest.importorskip("PyQt5.QtCore")
+
+from game_logic import GameField  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+def test_replay_of_animated_game(app):
+    field = GameField(8, 8, 4, seed=3)
+    rng = np.random.default_rng(3)
+    for _ in range(40):
+        if not field.is_same_cells_present():
+            break
+        labels, sizes, _, _ = field.engine.label_groups()
+        clickable = np.flatnonzero(sizes[labels] >= field.ITEMS_IN_LINE)
+        if not len(clickable):
+            field.settle()
+            continue
+        y, x = divmod(int(rng.choice(clickable)), field.WIDTH)
+        field.cell_clicked(field.items[y, x])
+        # Moves come in the middle of falling animation, some frames are played
+        for _ in range(int(rng.integers(0, 4))):
+            field.animation_tick()
+    field.settle()
+
+    log, _ = ReplayLog.from_bytes(field.game_record()["replay"])
+    score, engine = replay(log)
+    assert log.cells_count + ReplayLog.SPAWN in log.events
+    assert score == field.score == log.score
+    np.testing.assert_array_equal(engine.cells, field.engine.cells)
@@ -0,0 +1,29 @@
+import sqlite3
+
+import pytest
+
+from score_store import ScoreStore
+
+
+def test_leaderboard_by_board(tmp_path):
+    with ScoreStore(str(tmp_path / "scores.db")) as store:
+        store.add_games(store.row(10, 10, 5, 2, seed, seed * 3, 10) for seed in range(20))
+        store.add_game(10, 10, 4, 2, 99, 1000, 10)
+        store.add_game(20, 10, 5, 2, 98, 2000, 10)
+        store.flush()
+        assert store.count() == 22
+        assert [row["score"] for row in store.leaderboard(10, 10, 5, limit=3)] == [57, 54, 51]
+        assert store.best_score(10, 10, 4) == 1000
+        assert store.best_score(5, 5, 5) == 0
+
+
+def test_unavailable_database_does_not_block(tmp_path):
+    store = ScoreStore(str(tmp_path / "missing" / "scores.db"))
+    store.add_game(10, 10, 5, 2, 1, 100, 10)
+    store.flush()
+    assert store.error is not None
+    store.add_games([store.row(10, 10, 5, 2, 1, 100, 10)])
+    store.flush()
+    with pytest.raises(sqlite3.Error):
+        store.leaderboard(10, 10, 5)
+    store.close()
@@ -0,0 +1,105 @@
+import asyncio
+
+import numpy as np
+
+import protocol
+from server import GameServer
+
+
+def payload_of(frame):
+    return frame[protocol.HEADER.size:]
+
+
+def request(server, frame, owned):
+    """Sends a request frame, returns (opcode, payload) of the response"""
+    response = server.handle(frame[protocol.HEADER.size - 1], payload_of(frame), owned)
+    return response[protocol.HEADER.size - 1], response[protocol.HEADER.size:]
+
+
+def new_session(server, owned, seed=1):
+    opcode, payload = request(server, protocol.new_request(6, 7, 3, seed=seed), owned)
+    assert opcode == protocol.GAME
+    return protocol.parse_game(payload)[0]
+
+
+def error_code(response):
+    opcode, payload = response
+    assert opcode == protocol.ERROR
+    return protocol.parse_error(payload)[0]
+
+
+def test_malformed_frames_get_bad_request():
+    server = GameServer()
+    owned = set()
+    session_id = new_session(server, owned)
+    assert error_code(request(server, protocol.frame(0x7F), owned)) == protocol.ERROR_BAD_REQUEST
+    assert error_code(request(server, protocol.frame(protocol.CLICK, b"\x01\x00"), owned)) == protocol.ERROR_BAD_REQUEST
+    assert error_code(request(server, protocol.frame(protocol.NEW), owned)) == protocol.ERROR_BAD_REQUEST
+    assert error_code(request(server, protocol.new_request(0, 7, 3), owned)) == protocol.ERROR_BAD_REQUEST
+    assert error_code(request(server, protocol.click_request(session_id, 6, 0), owned)) == protocol.ERROR_BAD_REQUEST
+
+
+def test_failing_handler_gets_bad_request():
+    server = GameServer()
+    owned = set()
+    session_id = new_session(server, owned)
+
+    def broken_click(y, x):
+        raise RuntimeError("broken")
+
+    server.sessions[session_id].engine.click = broken_click
+    assert error_code(request(server, protocol.click_request(session_id, 0, 0), owned)) == protocol.ERROR_BAD_REQUEST
+    opcode, _ = request(server, protocol.board_request(session_id), owned)
+    assert opcode == protocol.GAME
+
+
+def test_sessions_of_other_connections_are_not_reachable():
+    server = GameServer()
+    owner, other = set(), set()
+    session_id = new_session(server, owner)
+    for frame in (protocol.click_request(session_id, 0, 0), protocol.board_request(session_id),
+                  protocol.close_request(session_id)):
+        assert error_code(request(server, frame, other)) == protocol.ERROR_NO_SESSION
+    assert session_id in server.sessions
+    opcode, _ = request(server, protocol.close_request(session_id), owner)
+    assert opcode == protocol.CLOSED
+    assert not server.sessions and not owner
+
+
+def test_click_diff_mirrors_board():
+    server = GameServer()
+    owned = set()
+    _, payload = request(server, protocol.new_request(6, 7, 3, seed=5), owned)
+    session_id, cells, _, _, over = protocol.parse_game(payload)
+    engine = server.sessions[session_id].engine
+    while not over:
+        labels, sizes, _, _ = engine.label_groups()
+        y, x = divmod(int(np.flatnonzero(sizes[labels] >= 2)[0]), engine.width)
+        opcode, payload = request(server, protocol.click_request(session_id, y, x), owned)
+        assert opcode == protocol.DIFF
+        _, cleared, _, _, over, changes = protocol.parse_diff(payload)
+        assert cleared >= 2
+        cells.ravel()[changes["cell"]] = changes["color"]
+        np.testing.assert_array_equal(cells, engine.cells)
+
+
+def test_sessions_are_closed_on_disconnect(tmp_path):
+    async def scenario():
+        server = GameServer()
+        path = str(tmp_path / "server.sock")
+        listener = await server.start(path=path)
+        reader, writer = await asyncio.open_unix_connection(path)
+        writer.write(protocol.new_request(5, 5, 3))
+        opcode, _ = await protocol.read_frame(reader)
+        assert opcode == protocol.GAME and len(server.sessions) == 1
+        writer.close()
+        await writer.wait_closed()
+        for _ in range(100):
+            if not server.sessions:
+                break
+            await asyncio.sleep(0.01)
+        listener.close()
+        await listener.wait_closed()
+        return len(server.sessions)
+
+    assert asyncio.run(scenario()) == 0
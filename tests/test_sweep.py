@@ -0,0 +1,25 @@
+import numpy as np
+
+from sweep import SweepSummary, run_sweep
+
+CONFIGS = [(6, 6, 4, "greedy"), (5, 7, 3, "random")]
+
+
+def sweep_results(processes: int, chunk_games: int):
+    summary = SweepSummary(CONFIGS)
+    games = {}
+    for config_index, first_game, stats, scores, moves in run_sweep(CONFIGS, 20, master_seed=7, processes=processes,
+                                                                    chunk_games=chunk_games, keep_games=True):
+        summary.add(config_index, stats)
+        for i, (score, game_moves) in enumerate(zip(scores.tolist(), moves.tolist())):
+            games[config_index, first_game + i] = (score, game_moves)
+    return summary, games
+
+
+def test_results_do_not_depend_on_processes_or_chunks():
+    single, single_games = sweep_results(processes=1, chunk_games=20)
+    pooled, pooled_games = sweep_results(processes=2, chunk_games=3)
+    assert single_games == pooled_games
+    assert len(single_games) == 20 * len(CONFIGS)
+    for field in ("games", "score_sum", "score_sq_sum", "score_min", "score_max", "moves_sum"):
+        np.testing.assert_array_equal(getattr(single, field), getattr(pooled, field))